@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+from typing import Dict, List, Optional
+from app.utils.detections import Detections
+from synthetic_video import AWAY_KIT, BALL, HOME_KIT
+
+# How far (per BGR channel) a compressed pixel may drift from its drawn colour
+COLOUR_TOLERANCE = 40
+
+class BlobDetector:
+    """
+    Colour-blob detector for synthetic videos, standing in for YOLO
+    
+    Finds the players and the ball drawn by synthetic_video by their
+    colours, so the rest of the pipeline can be benchmarked on machines
+    without the YOLO weights. Same interface as YOLODetector.
+    """
+    
+    def __init__(self, config: Dict, model_config: Optional[Dict] = None):
+        self.config = config
+        self.model_config = model_config or {}
+        self.batch_size = self.model_config.get('batch_size', 1)
+        self.class_names = {0: 'person', 32: 'sports ball'}
+        self.min_area = config.get('min_blob_area', 6)
+        print("Using colour-blob detector (synthetic videos only)")
+    
+    def detect(self, frame: np.ndarray) -> Detections:
+        return self.detect_batch([frame])[0]
+    
+    def detect_batch(self, frames: List[np.ndarray]) -> List[Detections]:
+        return [self._detect(frame) for frame in frames]
+    
+    def _detect(self, frame: np.ndarray) -> Detections:
+        boxes, class_ids = [], []
+        for colour, class_id in ((HOME_KIT, 0), (AWAY_KIT, 0), (BALL, 32)):
+            lower = np.clip(np.array(colour) - COLOUR_TOLERANCE, 0, 255).astype(np.uint8)
+            upper = np.clip(np.array(colour) + COLOUR_TOLERANCE, 0, 255).astype(np.uint8)
+            mask = cv2.inRange(frame, lower, upper)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                if w * h >= self.min_area:
+                    boxes.append((x, y, x + w, y + h))
+                    class_ids.append(class_id)
+        return Detections(boxes, np.full(len(boxes), 0.9), class_ids, class_names=self.class_names)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+EVENTS = ['pass', 'shot', 'goal', 'tackle', 'corner', 'free_kick', 'dribble', 'save']
+LINES = [
+    "What a move down the wing!",
+    "He picks out his teammate beautifully.",
+    "The keeper has it covered.",
+    "Danger in the box now!",
+    "Brilliant footwork from the midfielder."
+]
+
+class MockOpenAIServer:
+    """
+    Local stand-in for the OpenAI endpoints the worker calls
+    
+    Serves chat completions (plain and streamed), vision requests (chat
+    completions with images) and speech on 127.0.0.1, each after a
+    configurable delay, so API-bound stages can be benchmarked without a
+    network. Vision answers are derived from a hash of the request, so the
+    same frames always get the same event.
+    """
+    
+    def __init__(self, latency: Optional[Dict[str, float]] = None, event_rate: float = 0.3,
+                 seed: int = 0, port: int = 0):
+        """
+        Args:
+            latency: Seconds per request by endpoint: 'chat', 'vision' and 'speech'
+            event_rate: Fraction of vision requests that report an event
+            seed: Mixed into the vision answers
+            port: Port to listen on (0 picks a free one)
+        """
+        self.latency = {'chat': 0.3, 'vision': 0.8, 'speech': 0.4, **(latency or {})}
+        self.event_rate = event_rate
+        self.seed = seed
+        self.requests = {'chat': 0, 'vision': 0, 'speech': 0}
+        # Most requests that were being handled at the same time
+        self.peak_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] += 1
+    
+    def _enter(self):
+        with self._lock:
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+    
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+    
+    def _vision_answer(self, body: bytes) -> str:
+        rng = random.Random(hashlib.sha256(body).digest() + str(self.seed).encode())
+        if rng.random() >= self.event_rate:
+            return json.dumps({"event": "play", "confidence": 0.5, "description": "general play"})
+        event = rng.choice(EVENTS)
+        return json.dumps({
+            "event": event,
+            "confidence": round(rng.uniform(0.8, 0.98), 2),
+            "description": f"synthetic {event.replace('_', ' ')}"
+        })
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_POST(self):
+                server._enter()
+                try:
+                    self._post()
+                finally:
+                    server._exit()
+            
+            def _post(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path.endswith('/chat/completions'):
+                    self._chat(body)
+                elif self.path.endswith('/audio/speech'):
+                    server._count('speech')
+                    time.sleep(server.latency['speech'])
+                    request = json.loads(body)
+                    # Not real MP3; the worker only forwards the bytes
+                    self._send(200, b'ID3' + request.get('input', '').encode() * 64, 'audio/mpeg')
+                else:
+                    self._send(404, b'{"error": {"message": "Not found"}}', 'application/json')
+            
+            def _chat(self, body: bytes):
+                request = json.loads(body)
+                vision = any(
+                    isinstance(message.get('content'), list)
+                    and any(part.get('type') == 'image_url' for part in message['content'])
+                    for message in request.get('messages', [])
+                )
+                if vision:
+                    server._count('vision')
+                    time.sleep(server.latency['vision'])
+                    content = server._vision_answer(body)
+                else:
+                    server._count('chat')
+                    content = random.choice(LINES)
+                
+                if request.get('stream'):
+                    self._stream(request, content)
+                    return
+                if not vision:
+                    time.sleep(server.latency['chat'])
+                self._send(200, json.dumps({
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model', 'mock'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+                }).encode(), 'application/json')
+            
+            def _stream(self, request: Dict, content: str):
+                """Server-sent events: half the latency to the first token, the rest spread over the words"""
+                words = content.split(' ')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(server.latency['chat'] / 2)
+                for i, word in enumerate(words):
+                    if i:
+                        time.sleep(server.latency['chat'] / 2 / len(words))
+                    self._event({
+                        'id': 'chatcmpl-mock',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': request.get('model', 'mock'),
+                        'choices': [{
+                            'index': 0,
+                            'delta': {'content': word if i == 0 else ' ' + word},
+                            'finish_reason': None
+                        }]
+                    })
+                self._chunk(b'data: [DONE]\n\n')
+                self._chunk(b'')
+            
+            def _event(self, payload: Dict):
+                self._chunk(f"data: {json.dumps(payload)}\n\n".encode())
+            
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            
+            def _send(self, status: int, data: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        
+        return Handler
@@ -0,0 +1,351 @@
+"""
+Offline benchmark of the commentary pipeline
+
+Generates a synthetic match, runs CommentaryPipeline.process_video on it
+against a local OpenAI-compatible mock server and an in-process fake
+Redis, and reports per-stage frames/s, latency percentiles,
+event-to-publish latency and peak RSS. Needs no GPU and no network.
+    
+    python benchmarks/run.py
+    python benchmarks/run.py --baseline benchmarks/baselines/default.json
+    python benchmarks/run.py --baseline benchmarks/baselines/default.json --update
+    
+With --baseline, the scenario is read from the baseline file and the run
+exits with status 1 if any checked result is worse than the baseline by
+more than the tolerance. --update stores the new results instead.
+Baselines are machine-specific: record them on the machine that checks them.
+"""
+import argparse
+import asyncio
+import copy
+import importlib.util
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Dict, List, Optional
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKER_DIR = ROOT / 'services' / 'worker'
+CONFIGS_DIR = ROOT / 'configs'
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(WORKER_DIR))
+
+from mock_openai import MockOpenAIServer
+from synthetic_video import generate_match
+
+DEFAULT_SCENARIO = {
+    'video': {'seconds': 60, 'width': 1280, 'height': 720, 'fps': 25, 'players': 22, 'seed': 0},
+    # Mock API delay in seconds per request
+    'latency': {'chat': 0.3, 'vision': 0.8, 'speech': 0.4},
+    # Fraction of vision requests that report an event. The frame cache folds
+    # the synthetic match's look-alike windows into very few requests, so
+    # every one reports an event to keep event-to-publish latency measured
+    'event_rate': 1.0,
+    # 'yolo', 'synthetic' (colour blobs), or 'auto' for YOLO when its weights are present
+    'detector': 'auto',
+    'parallel': False,
+    # Merged into configs/pipeline.yaml
+    'pipeline': {}
+}
+
+# Stages that handle every sampled (or live) frame
+FRAME_STAGES = ('decode', 'gate', 'detect', 'track', 'classify', 'aggregate')
+
+# Checked when a baseline does not list its own: result path -> which direction is better
+DEFAULT_CHECKS = {
+    'fps': 'higher',
+    'stages.decode.frames_per_s': 'higher',
+    'stages.detect.frames_per_s': 'higher',
+    'stages.track.frames_per_s': 'higher',
+    'event_to_publish.mean_ms': 'lower',
+    'peak_rss_mb': 'lower'
+}
+
+def merge(base: Dict, overrides: Dict) -> Dict:
+    """Recursively merge overrides into a copy of base"""
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+def write_config(scenario: Dict, directory: Path) -> Path:
+    """Pipeline config for the run, next to a copy of models.yaml"""
+    with open(CONFIGS_DIR / 'pipeline.yaml') as f:
+        config = yaml.safe_load(f)
+    # Keep synthesized speech out of the worker's cache
+    overrides = merge({'tts': {'cache_dir': str(directory / 'tts')}}, scenario['pipeline'])
+    config['pipeline'] = merge(config['pipeline'], overrides)
+    
+    config_path = directory / 'pipeline.yaml'
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+    if (CONFIGS_DIR / 'models.yaml').exists():
+        (directory / 'models.yaml').write_text((CONFIGS_DIR / 'models.yaml').read_text())
+    return config_path
+
+def resolve_detector(detector: str) -> str:
+    if detector != 'auto':
+        return detector
+    with open(CONFIGS_DIR / 'models.yaml') as f:
+        weights = (yaml.safe_load(f) or {}).get('models', {}).get('yolo', {}).get('path', '')
+    if importlib.util.find_spec('ultralytics') and weights and (WORKER_DIR / weights).exists():
+        return 'yolo'
+    return 'synthetic'
+
+def use_blob_detector():
+    """Make the pipeline construct BlobDetector where it would load YOLO"""
+    from blob_detector import BlobDetector
+    module = types.ModuleType('app.detectors.yolo_detector')
+    module.YOLODetector = BlobDetector
+    sys.modules['app.detectors.yolo_detector'] = module
+
+def quantile(q: float, bounds: List[float], buckets: List[int]) -> Optional[float]:
+    """
+    Estimate a quantile from histogram buckets by linear interpolation
+    
+    Returns:
+        None when there are no observations or the quantile falls in the
+        first bucket, where it is only known to be below bounds[0]
+    """
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    cumulative, lower = 0, None
+    for upper, count in zip(list(bounds) + [math.inf], buckets):
+        if count and cumulative + count >= rank:
+            if lower is None:
+                return None
+            if math.isinf(upper):
+                return lower
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = upper
+    return lower
+
+def summarize(snapshot: Dict, bounds: List[float]) -> Dict:
+    """Per-series count, mean and percentiles (milliseconds) of a metrics snapshot"""
+    summary = {}
+    for key, (buckets, total, count) in snapshot['histograms'].items():
+        p50, p95 = quantile(0.5, bounds, buckets), quantile(0.95, bounds, buckets)
+        summary[key] = {
+            'count': count,
+            'total_s': round(total, 6),
+            'mean_ms': round(total / count * 1000, 3) if count else None,
+            'p50_ms': round(p50 * 1000, 3) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 3) if p95 is not None else None
+        }
+    return summary
+
+def stage_results(histograms: Dict, counters: Dict) -> Dict:
+    """
+    Per-stage summaries with the frames each stage handles per second spent in it
+    
+    Every frame stage sees the same frames over the same wall time, so the
+    rate is taken over the stage's own time, which is what singles out the
+    bottleneck. Gate and detect are timed once per batch, so their frames
+    come from the frame counters; the other per-frame stages are timed once
+    per frame. Commentary stages handle events rather than frames and get
+    no rate.
+    """
+    prefix = 'stage_seconds{stage="'
+    frames = {
+        'gate': counters.get('frames_total', 0),
+        'detect': counters.get('frames_detected_total', 0)
+    }
+    stages = {}
+    for key, summary in sorted(histograms.items()):
+        if not key.startswith(prefix):
+            continue
+        stage = key[len(prefix):-2]
+        handled = frames.get(stage, summary['count'] if stage in FRAME_STAGES else None)
+        stages[stage] = dict(summary)
+        if handled is not None:
+            stages[stage]['frames'] = int(handled)
+            stages[stage]['frames_per_s'] = round(handled / summary['total_s'], 2) if summary['total_s'] else None
+    return stages
+
+async def run(scenario: Dict, redis_url: Optional[str] = None) -> Dict:
+    detector = resolve_detector(scenario['detector'])
+    if detector == 'synthetic':
+        if scenario['parallel']:
+            raise SystemExit("The synthetic detector cannot be used by segment worker processes; "
+                             "use the YOLO detector for parallel scenarios")
+        use_blob_detector()
+    
+    server = MockOpenAIServer(scenario['latency'], scenario['event_rate'], seed=scenario['video']['seed'])
+    server.start()
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    # Relative model and cache paths resolve like in the worker
+    os.chdir(WORKER_DIR)
+    
+    from app.pipeline import CommentaryPipeline
+    from app.utils.metrics import BUCKETS, metrics, series
+    
+    with tempfile.TemporaryDirectory(prefix='commentary-bench-') as directory:
+        directory = Path(directory)
+        print("Generating synthetic match...")
+        video = generate_match(directory / 'match.mp4', **scenario['video'])
+        config_path = write_config(scenario, directory)
+        
+        if redis_url:
+            import redis.asyncio as redis
+            redis_client = await redis.from_url(redis_url, decode_responses=True)
+        else:
+            import fakeredis
+            redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        
+        start = time.perf_counter()
+        pipeline = CommentaryPipeline(str(config_path))
+        startup = time.perf_counter() - start
+        try:
+            metrics.drain()
+            start = time.perf_counter()
+            await pipeline.for_job().process_video(video['path'], 'benchmark', redis_client,
+                                                   parallel=scenario['parallel'])
+            wall = time.perf_counter() - start
+            status = await redis_client.get('job:benchmark:status')
+            lines = await redis_client.xlen('job:benchmark:commentary')
+            await redis_client.delete('job:benchmark:commentary', 'job:benchmark:status', 'job:benchmark:queues')
+        finally:
+            pipeline.segment_pool.shutdown(cancel_futures=True)
+            server.stop()
+        if status != 'completed':
+            raise SystemExit(f"Benchmark job did not complete: {status}")
+    
+    snapshot = metrics.drain()
+    histograms = summarize(snapshot, BUCKETS)
+    counters = snapshot['counters']
+    frames = counters.get('frames_total', 0)
+    results = {
+        'detector': detector,
+        'startup_seconds': round(startup, 3),
+        'wall_seconds': round(wall, 3),
+        'frames': int(frames),
+        # Sampled frames per second, end to end
+        'fps': round(frames / wall, 2) if wall else None,
+        'frames_dropped': int(sum(v for k, v in counters.items() if k.startswith('frames_dropped_total'))),
+        # The end marker is logged too
+        'commentary_lines': lines - 1,
+        'stages': stage_results(histograms, counters),
+        'event_to_publish': histograms.get('event_to_publish_seconds', {}),
+        'external_api': {
+            api: histograms.get(series('external_api_seconds', api=api), {})
+            for api in ('vlm', 'commentary', 'tts')
+            if series('external_api_seconds', api=api) in histograms
+        },
+        'api_requests': dict(server.requests),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    if scenario['parallel']:
+        results['peak_worker_rss_mb'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    return results
+
+def lookup(results: Dict, path: str):
+    value = results
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    """
+    Check results against a baseline
+    
+    Returns:
+        One message per regression
+    """
+    tolerance = baseline.get('tolerance', 0.25)
+    regressions = []
+    for path, better in baseline.get('checks', DEFAULT_CHECKS).items():
+        expected, actual = lookup(baseline.get('results', {}), path), lookup(results, path)
+        if expected is None:
+            continue
+        if actual is None:
+            regressions.append(f"{path}: missing (baseline {expected})")
+        elif better == 'higher' and actual < expected * (1 - tolerance):
+            regressions.append(f"{path}: {actual} < {expected} - {tolerance:.0%}")
+        elif better == 'lower' and actual > expected * (1 + tolerance):
+            regressions.append(f"{path}: {actual} > {expected} + {tolerance:.0%}")
+    return regressions
+
+def report(results: Dict):
+    print(f"\nDetector: {results['detector']}, startup {results['startup_seconds']} s")
+    print(f"{results['frames']} sampled frames in {results['wall_seconds']} s ({results['fps']} frames/s), "
+          f"{results['frames_dropped']} dropped, {results['commentary_lines']} commentary lines")
+    print(f"\n{'stage':<12}{'calls':>8}{'frames/s':>12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    rows = [(stage, values) for stage, values in results['stages'].items()]
+    rows += [(f"api:{api}", values) for api, values in results['external_api'].items()]
+    rows.append(('event->pub', results['event_to_publish']))
+    for name, values in rows:
+        if not values:
+            continue
+        print(f"{name:<12}{values['count']:>8}{values.get('frames_per_s') or '-':>12}"
+              f"{values['mean_ms'] or '-':>10}{values['p50_ms'] or '-':>10}{values['p95_ms'] or '-':>10}")
+    print("(gate and detect calls cover a batch of frames; frames/s is per second spent in the stage;")
+    print(" percentiles under the first histogram bucket are shown as -)")
+    print(f"\nPeak RSS: {results['peak_rss_mb']} MB", end='')
+    if 'peak_worker_rss_mb' in results:
+        print(f", largest segment worker {results['peak_worker_rss_mb']} MB", end='')
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the commentary pipeline offline")
+    parser.add_argument('--baseline', type=Path, help="Baseline JSON with the scenario and expected results")
+    parser.add_argument('--update', action='store_true', help="Store the results in the baseline instead of checking")
+    parser.add_argument('--scenario', type=json.loads, default={},
+                        help="JSON merged into the scenario, e.g. '{\"video\": {\"seconds\": 10}}'")
+    parser.add_argument('--redis-url', help="Use this Redis instead of an in-process fake")
+    parser.add_argument('--output', type=Path, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    # The run changes into the worker directory
+    args.baseline = args.baseline.resolve() if args.baseline else None
+    args.output = args.output.resolve() if args.output else None
+    
+    baseline = {}
+    if args.baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+    scenario = merge(merge(DEFAULT_SCENARIO, baseline.get('scenario', {})), args.scenario)
+    
+    results = asyncio.run(run(scenario, args.redis_url))
+    report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + '\n')
+    
+    if args.baseline is None:
+        return
+    if args.update or not baseline:
+        baseline = {
+            'scenario': scenario,
+            'tolerance': baseline.get('tolerance', 0.25),
+            'checks': baseline.get('checks', DEFAULT_CHECKS),
+            'results': results
+        }
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return
+    
+    regressions = compare(results, baseline)
+    if regressions:
+        print(f"\nRegressions against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Dict
+
+# BGR colours; detection in the benchmark keys on the kits and the ball
+PITCH = (60, 140, 40)
+LINES = (235, 235, 235)
+HOME_KIT = (40, 40, 210)
+AWAY_KIT = (200, 90, 30)
+BALL = (0, 220, 255)
+
+def generate_match(path: Path, seconds: float = 60.0, width: int = 1280, height: int = 720,
+                   fps: float = 25.0, players: int = 22, seed: int = 0) -> Dict:
+    """
+    Write a synthetic broadcast-style football video
+    
+    A wide shot of a pitch with two teams of coloured players wandering
+    around their positions and a ball that is passed between random
+    players, so every stage of the pipeline has work to do.
+    
+    Args:
+        path: Output .mp4 path
+        seconds: Length of the video
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Frame rate
+        players: Number of players, split between the two teams
+        seed: Random seed; the same arguments always give the same video
+        
+    Returns:
+        Video properties, including the number of frames written
+    """
+    rng = np.random.default_rng(seed)
+    frame_count = int(round(seconds * fps))
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write video: {path}")
+    
+    pitch = _draw_pitch(width, height)
+    player_w, player_h = max(4, width // 90), max(8, height // 28)
+    ball_r = max(2, width // 320)
+    margin = np.array([player_w, player_h], dtype=np.float64)
+    size = np.array([width, height], dtype=np.float64)
+    
+    home = rng.uniform(margin, size - margin, size=(players, 2))
+    positions = home.copy()
+    velocities = np.zeros_like(positions)
+    ball = positions[0].copy()
+    target = int(rng.integers(players)) if players else 0
+    ball_speed = width / fps * 0.6
+    
+    try:
+        for _ in range(frame_count):
+            # Players drift around their home positions
+            velocities = 0.9 * velocities + rng.normal(0, 0.6, size=velocities.shape) + 0.01 * (home - positions)
+            positions = np.clip(positions + velocities, margin, size - margin)
+            
+            # The ball travels to its target player, who then passes it on
+            if players:
+                offset = positions[target] - ball
+                distance = np.linalg.norm(offset)
+                if distance <= ball_speed:
+                    ball = positions[target].copy()
+                    target = int(rng.integers(players))
+                else:
+                    ball += offset / distance * ball_speed
+            
+            frame = pitch.copy()
+            for i, (x, y) in enumerate(positions):
+                kit = HOME_KIT if i % 2 == 0 else AWAY_KIT
+                top_left = (int(x - player_w / 2), int(y - player_h))
+                bottom_right = (int(x + player_w / 2), int(y))
+                cv2.rectangle(frame, top_left, bottom_right, kit, -1)
+            if players:
+                cv2.circle(frame, (int(ball[0]), int(ball[1])), ball_r, BALL, -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    
+    return {
+        'path': str(path),
+        'frames': frame_count,
+        'fps': fps,
+        'width': width,
+        'height': height,
+        'players': players
+    }
+
+def _draw_pitch(width: int, height: int) -> np.ndarray:
+    pitch = np.empty((height, width, 3), dtype=np.uint8)
+    pitch[:] = PITCH
+    # Mown stripes
+    stripe = max(1, width // 12)
+    for x in range(0, width, stripe * 2):
+        pitch[:, x:x + stripe] = (50, 128, 34)
+    thickness = max(1, width // 640)
+    inset = width // 40
+    cv2.rectangle(pitch, (inset, inset), (width - inset, height - inset), LINES, thickness)
+    cv2.line(pitch, (width // 2, inset), (width // 2, height - inset), LINES, thickness)
+    cv2.circle(pitch, (width // 2, height // 2), height // 8, LINES, thickness)
+    return pitch
@@ -8,8 +8,21 @@ const status = document.getElementById('status');
 
 let ws = null;
 
+// Server-side speech: line_ids whose audio is expected, and playback scheduling
+const pendingAudio = new Set();
+let audioContext = null;
+let audioPlaybackEnd = 0;
+let audioDecodeChain = Promise.resolve();
+
+// Commentary log position of the current job, for resuming after a reconnect
+let currentJobId = null;
+let lastSeenOffset = null;
+let jobEnded = false;
+let reconnectAttempts = 0;
+
 // API endpoint
 const API_URL = 'http://localhost:8000';
+const MAX_UPLOAD_RETRIES = 5;
 
 // Load voices when they become available
 if ('speechSynthesis' in window) {
@@ -41,20 +54,64 @@ async function uploadVideo(file) {
     try {
         showStatus('Uploading video...', 'success');
         
-        const formData = new FormData();
-        formData.append('file', file);
-        
-        const response = await fetch(`${API_URL}/upload`, {
+        // Resumable upload: create it, then send the file in chunks at increasing offsets
+        const created = await fetch(`${API_URL}/uploads`, {
             method: 'POST',
-            body: formData
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
         });
-        
-        if (!response.ok) {
+        if (!created.ok) {
             throw new Error('Upload failed');
         }
+        const { upload_id: uploadId, chunk_size: chunkSize } = await created.json();
         
-        const result = await response.json();
-        showStatus('Video uploaded successfully! Processing...', 'success');
+        let offset = 0;
+        let result = null;
+        let retries = 0;
+        while (result === null || result.job_id === undefined) {
+            try {
+                const response = await fetch(`${API_URL}/uploads/${uploadId}`, {
+                    method: 'PATCH',
+                    headers: { 'Upload-Offset': String(offset) },
+                    body: file.slice(offset, offset + chunkSize)
+                });
+                if (response.status === 409) {
+                    // Server has a different offset (e.g. a chunk landed but the reply was lost)
+                    offset = Number(response.headers.get('Upload-Offset'));
+                    continue;
+                }
+                if (!response.ok) {
+                    const error = new Error((await response.json()).error || 'Upload failed');
+                    // Client errors (bad length, checksum mismatch) will not go away on retry
+                    error.fatal = response.status < 500;
+                    throw error;
+                }
+                result = await response.json();
+                offset = result.offset;
+                retries = 0;
+                showStatus(`Uploading video... ${Math.floor(100 * offset / file.size)}%`, 'success');
+            } catch (error) {
+                if (error.fatal || ++retries > MAX_UPLOAD_RETRIES) {
+                    throw error;
+                }
+                // Network error: wait, then resume from whatever the server has
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                try {
+                    const head = await fetch(`${API_URL}/uploads/${uploadId}`, { method: 'HEAD' });
+                    if (head.ok) {
+                        offset = Number(head.headers.get('Upload-Offset'));
+                    }
+                } catch (headError) {
+                    // Still unreachable; the next attempt counts against the same retries
+                }
+            }
+        }
+        
+        if (result.reused) {
+            showStatus('This video was already processed - replaying its commentary', 'success');
+        } else {
+            showStatus('Video uploaded successfully! Processing...', 'success');
+        }
         
         // Connect WebSocket with job_id
         connectWebSocket(result.job_id);
@@ -67,28 +124,56 @@ async function uploadVideo(file) {
 
 function connectWebSocket(jobId) {
     console.log('Connecting WebSocket for job:', jobId);
+    if (jobId !== currentJobId) {
+        // New job: start from the beginning of its commentary log
+        currentJobId = jobId;
+        lastSeenOffset = null;
+        jobEnded = false;
+        reconnectAttempts = 0;
+        if (ws) {
+            ws.close();
+        }
+    }
+    
     ws = new WebSocket('ws://localhost:8000/ws/commentary');
+    ws.binaryType = 'arraybuffer';
     
     ws.onopen = () => {
         console.log('WebSocket connected');
         showStatus('Connected! Waiting for commentary...', 'success');
+        reconnectAttempts = 0;
         
-        // Wait a bit for connection to fully establish
-        setTimeout(() => {
-            // Send job_id to start receiving commentary
-            const message = JSON.stringify({ job_id: jobId });
-            console.log('Sending job_id:', message);
-            ws.send(message);
-        }, 100);
+        // Send job_id to start receiving commentary; the server replays
+        // everything logged after last_seen before going live
+        const message = JSON.stringify({ job_id: jobId, last_seen: lastSeenOffset });
+        console.log('Sending job_id:', message);
+        ws.send(message);
     };
     
     ws.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+            // Binary frame: 4-byte big-endian line_id followed by encoded audio
+            playCommentaryAudio(event.data);
+            return;
+        }
+        
         console.log('Received message:', event.data);
         const data = JSON.parse(event.data);
+        if (data.offset) {
+            lastSeenOffset = data.offset;
+        }
         
-        if (data.commentary) {
+        if (data.type === 'delta') {
+            // Partial text while the line is still being generated
+            appendCommentaryDelta(data.line_id, data.seq, data.text, data.timestamp);
+        } else if (data.type === 'end') {
+            jobEnded = true;
+            if (data.status !== 'completed') {
+                showStatus('Processing failed: ' + data.status, 'error');
+            }
+        } else if (data.commentary) {
             console.log('Commentary received:', data.commentary);
-            addCommentary(data.commentary, data.timestamp);
+            addCommentary(data.commentary, data.timestamp, data.line_id, data.audio);
         } else if (data.status) {
             console.log('Status:', data.message);
         } else if (data.error) {
@@ -102,15 +187,27 @@ function connectWebSocket(jobId) {
         showStatus('Connection error', 'error');
     };
     
+    const socket = ws;
     ws.onclose = () => {
         console.log('WebSocket disconnected');
-        showStatus('Processing complete!', 'success');
+        if (socket !== ws || jobId !== currentJobId) {
+            return;
+        }
+        if (jobEnded) {
+            showStatus('Processing complete!', 'success');
+            return;
+        }
+        // Reconnect and pick up after the last record received
+        const delay = Math.min(1000 * 2 ** reconnectAttempts++, 30000);
+        showStatus('Connection lost, reconnecting...', 'error');
+        setTimeout(() => connectWebSocket(jobId), delay);
     };
 }
 
-function addCommentary(text, timestamp) {
-    const time = timestamp ? `[${formatTime(timestamp)}] ` : '';
-    
+// Streamed deltas per line_id, indexed by seq
+const partialLines = new Map();
+
+function getCommentaryLine(lineId) {
     // Get or create commentary text container
     let commentaryText = document.getElementById('commentaryText');
     if (!commentaryText) {
@@ -120,16 +217,80 @@ function addCommentary(text, timestamp) {
         commentary.appendChild(commentaryText);
     }
     
-    const newComment = document.createElement('p');
-    newComment.textContent = `${time}${text}`;
-    newComment.style.marginBottom = '10px';
-    newComment.style.animation = 'fadeIn 0.3s';
+    let line = lineId !== undefined ? document.getElementById(`line-${lineId}`) : null;
+    if (!line) {
+        line = document.createElement('p');
+        if (lineId !== undefined) {
+            line.id = `line-${lineId}`;
+        }
+        line.style.marginBottom = '10px';
+        line.style.animation = 'fadeIn 0.3s';
+        commentaryText.appendChild(line);
+    }
+    return line;
+}
+
+function appendCommentaryDelta(lineId, seq, text, timestamp) {
+    const time = timestamp ? `[${formatTime(timestamp)}] ` : '';
+    
+    const deltas = partialLines.get(lineId) || [];
+    deltas[seq] = text;
+    partialLines.set(lineId, deltas);
     
-    commentaryText.appendChild(newComment);
+    const line = getCommentaryLine(lineId);
+    line.textContent = `${time}${deltas.join('')}`;
+    commentary.scrollTop = commentary.scrollHeight;
+}
+
+function addCommentary(text, timestamp, lineId, hasAudio) {
+    const time = timestamp ? `[${formatTime(timestamp)}] ` : '';
+    
+    // The complete message replaces any partial text for the line
+    partialLines.delete(lineId);
+    const line = getCommentaryLine(lineId);
+    line.textContent = `${time}${text}`;
     commentary.scrollTop = commentary.scrollHeight;
     
-    // Speak the commentary using Web Speech API
-    speakCommentary(text);
+    if (hasAudio) {
+        // Audio for this line follows as a binary message; fall back to
+        // browser speech if it does not arrive in time
+        pendingAudio.add(lineId);
+        setTimeout(() => {
+            if (pendingAudio.delete(lineId)) {
+                speakCommentary(text);
+            }
+        }, 5000);
+    } else {
+        // Speak the commentary using Web Speech API
+        speakCommentary(text);
+    }
+}
+
+function playCommentaryAudio(buffer) {
+    const lineId = new DataView(buffer).getUint32(0);
+    pendingAudio.delete(lineId);
+    
+    // A line may arrive as several chunks; decode one at a time to keep their order
+    audioDecodeChain = audioDecodeChain.then(() => scheduleCommentaryAudio(buffer));
+}
+
+async function scheduleCommentaryAudio(buffer) {
+    try {
+        if (!audioContext) {
+            audioContext = new (window.AudioContext || window.webkitAudioContext)();
+        }
+        const audioBuffer = await audioContext.decodeAudioData(buffer.slice(4));
+        
+        // Queue lines back to back instead of talking over each other
+        const source = audioContext.createBufferSource();
+        source.buffer = audioBuffer;
+        source.connect(audioContext.destination);
+        const startAt = Math.max(audioContext.currentTime, audioPlaybackEnd);
+        source.start(startAt);
+        audioPlaybackEnd = startAt + audioBuffer.duration;
+    } catch (error) {
+        console.error('Audio playback error:', error);
+    }
 }
 
 function speakCommentary(text) {
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+class Viewer:
+    """
+    One WebSocket's view of a job: a bounded queue of outgoing messages
+    
+    Messages are ('text', str) or ('bytes', bytes). A viewer that falls
+    more than max_pending messages behind is dropped instead of slowing
+    down the others; get() then returns None and the client reconnects,
+    replaying what it missed from the commentary log.
+    """
+    
+    def __init__(self, job_id: str, max_pending: int):
+        self.job_id = job_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = False
+    
+    def push(self, message: Tuple[str, object]) -> bool:
+        """Queue a message without waiting; returns False once the viewer is dropped"""
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.drop()
+            return False
+    
+    def drop(self):
+        self.dropped = True
+        # Make room for the end marker so get() wakes up
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+    
+    async def get(self) -> Optional[Tuple[str, object]]:
+        return await self.queue.get()
+
+class CommentaryHub:
+    """
+    Fan-out of job channels to the WebSockets of this API process
+    
+    All jobs share one Redis pub/sub connection, subscribed to a job's
+    commentary and audio channels while it has at least one local viewer.
+    Each message is decoded once and handed, as is, to every viewer's
+    queue.
+    """
+    
+    def __init__(self, redis_client, max_pending: int = 256):
+        self.redis = redis_client
+        self.max_pending = max_pending
+        self.pubsub = None
+        self.viewers: Dict[str, Set[Viewer]] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+    
+    @property
+    def viewer_count(self) -> int:
+        return sum(len(viewers) for viewers in self.viewers.values())
+    
+    async def join(self, job_id: str) -> Viewer:
+        """
+        Start following a job
+        
+        Returns once the job's channels are subscribed, so anything
+        published afterwards reaches the viewer.
+        """
+        viewer = Viewer(job_id, self.max_pending)
+        async with self._lock:
+            if job_id not in self.viewers:
+                if self.pubsub is None:
+                    self.pubsub = self.redis.pubsub()
+                await self.pubsub.subscribe(f"commentary:{job_id}", f"audio:{job_id}")
+                self.viewers[job_id] = set()
+            self.viewers[job_id].add(viewer)
+            # listen() ends whenever nothing is subscribed, so restart it on demand
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return viewer
+    
+    async def leave(self, viewer: Viewer):
+        async with self._lock:
+            viewers = self.viewers.get(viewer.job_id)
+            if viewers is None:
+                return
+            viewers.discard(viewer)
+            if not viewers:
+                del self.viewers[viewer.job_id]
+                await self.pubsub.unsubscribe(f"commentary:{viewer.job_id}", f"audio:{viewer.job_id}")
+    
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+        for viewers in self.viewers.values():
+            for viewer in viewers:
+                viewer.drop()
+        self.viewers.clear()
+    
+    async def _read(self):
+        try:
+            async for message in self.pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                kind, _, job_id = message["channel"].decode().partition(":")
+                viewers = self.viewers.get(job_id)
+                if not viewers:
+                    continue
+                if kind == "audio":
+                    payload = ("bytes", message["data"])
+                else:
+                    payload = ("text", message["data"].decode("utf-8"))
+                for viewer in list(viewers):
+                    viewer.push(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Commentary hub error: {e}")
+            # Viewers reconnect and catch up from the log
+            async with self._lock:
+                for viewers in self.viewers.values():
+                    for viewer in viewers:
+                        viewer.drop()
+                self.viewers.clear()
+                await self.pubsub.aclose()
+                self.pubsub = None
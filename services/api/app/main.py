@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.routes import router
+from fastapi.responses import PlainTextResponse
+from app import routes
+from app.routes import router, REDIS_URL, get_redis
+from app.metrics import render_metrics
 import redis.asyncio as redis
 
 app = FastAPI(title="FIFA Commentator API")
@@ -13,6 +16,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Resumable uploads report offsets in headers
+    expose_headers=["Location", "Upload-Offset", "Upload-Length"],
 )
 
 # Include routes
@@ -24,10 +29,12 @@ redis_client = None
 @app.on_event("startup")
 async def startup_event():
     global redis_client
-    redis_client = await redis.from_url("redis://localhost:6379", decode_responses=True)
+    redis_client = await redis.from_url(REDIS_URL, decode_responses=True)
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if routes.commentary_hub is not None:
+        await routes.commentary_hub.close()
     if redis_client:
         await redis_client.close()
 
@@ -38,3 +45,13 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Pipeline metrics of all workers, in the Prometheus text format"""
+    hub = routes.commentary_hub
+    gauges = {"websocket_viewers": hub.viewer_count if hub is not None else 0}
+    return PlainTextResponse(
+        await render_metrics(await get_redis(), gauges),
+        media_type="text/plain; version=0.0.4"
+    )
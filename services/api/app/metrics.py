@@ -0,0 +1,108 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Written by the workers (services/worker/app/utils/metrics.py)
+COUNTERS_KEY = "metrics:counters"
+HISTOGRAMS_KEY = "metrics:histograms"
+INF_LABEL = 'le="+Inf"'
+
+HELP = {
+    "frames_total": "Sampled frames decoded and gated",
+    "frames_dropped_total": "Sampled frames skipped before detection",
+    "frames_detected_total": "Frames run through the object detector",
+    "classifier_cache_total": "Classification cache lookups (coalesced: waited for a similar frame's request in flight)",
+    "commentary_fallbacks_total": "Template lines used instead of the LLM because commentary was backed up",
+    "external_api_requests_total": "Requests made to external APIs",
+    "external_api_errors_total": "Failed requests to external APIs",
+    "external_api_seconds": "Latency of external API requests",
+    "stage_seconds": "Time per pipeline stage call (detect covers a batch of frames)",
+    "event_to_publish_seconds": "Time from an event leaving the aggregator to its commentary being published",
+    "websocket_viewers": "WebSockets following a job on this API process",
+}
+
+def split_series(key: str) -> Tuple[str, str]:
+    """'stage_seconds{stage="detect"}' -> ('stage_seconds', 'stage="detect"')"""
+    name, _, labels = key.partition("{")
+    return name, labels.rstrip("}")
+
+def with_labels(name: str, labels: str, extra: str = "") -> str:
+    labels = ",".join(part for part in (labels, extra) if part)
+    return f"{name}{{{labels}}}" if labels else name
+
+def format_value(value: float) -> str:
+    """Exact exposition value: integers without a decimal point, floats in full precision"""
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def _header(lines: List[str], name: str, kind: str):
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+async def render_metrics(redis_client, gauges: Dict[str, float]) -> str:
+    """
+    Render the workers' aggregated metrics in the Prometheus text format
+    
+    Workers add their deltas to Redis hashes, so the values are totals
+    across every worker since the hashes were created. Histogram buckets
+    are stored per bucket and made cumulative here.
+    
+    Args:
+        redis_client: Async Redis client with decode_responses=True
+        gauges: Values local to this API process, by series name
+        
+    Returns:
+        Exposition text
+    """
+    counters = await redis_client.hgetall(COUNTERS_KEY)
+    histogram_fields = await redis_client.hgetall(HISTOGRAMS_KEY)
+    lines = []
+    
+    families = defaultdict(list)
+    for key, value in counters.items():
+        name, labels = split_series(key)
+        families[name].append((labels, float(value)))
+    for name in sorted(families):
+        _header(lines, name, "counter")
+        for labels, value in sorted(families[name]):
+            lines.append(f"{with_labels(name, labels)} {format_value(value)}")
+    
+    # series -> {bound: count}, sum, count
+    histograms = defaultdict(lambda: [{}, 0.0, 0])
+    for field, value in histogram_fields.items():
+        key, _, part = field.rpartition("|")
+        if part == "sum":
+            histograms[key][1] = float(value)
+        elif part == "count":
+            histograms[key][2] = int(value)
+        else:
+            histograms[key][0][float(part)] = int(value)
+    
+    families = defaultdict(list)
+    for key in histograms:
+        name, labels = split_series(key)
+        families[name].append((labels, key))
+    for name in sorted(families):
+        _header(lines, name, "histogram")
+        for labels, key in sorted(families[name]):
+            buckets, total, count = histograms[key]
+            cumulative = 0
+            for bound in sorted(buckets):
+                if math.isinf(bound):
+                    continue
+                cumulative += buckets[bound]
+                le = 'le="%g"' % bound
+                lines.append(f"{with_labels(name + '_bucket', labels, le)} {cumulative}")
+            lines.append(f"{with_labels(name + '_bucket', labels, INF_LABEL)} {count}")
+            lines.append(f"{with_labels(name + '_sum', labels)} {format_value(total)}")
+            lines.append(f"{with_labels(name + '_count', labels)} {count}")
+    
+    for key, value in sorted(gauges.items()):
+        name, labels = split_series(key)
+        _header(lines, name, "gauge")
+        lines.append(f"{with_labels(name, labels)} {format_value(value)}")
+    
+    return "\n".join(lines) + "\n"
@@ -1,57 +1,169 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, UploadFile, File, Request, Header
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
 import json
 import asyncio
+import hashlib
 import redis.asyncio as redis
+import os
 import uuid
+import yaml
 from pathlib import Path
+from app.hub import CommentaryHub
+from app.uploads import CHUNK_SIZE, ResumableUploads, UploadConflict, UploadTooLarge
 
 router = APIRouter()
 
-# Store active WebSocket connections
-active_connections: list[WebSocket] = []
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Stream read by the worker consumer group
+JOB_STREAM = "video_jobs"
+
 redis_client = None
+# Binary-safe connection for audio messages
+redis_binary_client = None
+resumable_uploads = None
+# One Redis subscription per followed job, shared by all local WebSockets
+commentary_hub = None
 
 # Create uploads directory with absolute path
 UPLOADS_DIR = Path(__file__).parent.parent.parent.parent / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
+CONFIGS_DIR = Path(__file__).parent.parent.parent.parent / "configs"
+# Log records sent per range read when replaying commentary
+REPLAY_PAGE_SIZE = 500
+# Settings that change the commentary a video produces, by config file and
+# section. Anything else (queue sizes, concurrency, caches, devices, warm-up,
+# exports, speech) is operational and does not affect result reuse.
+RESULT_SETTINGS = {
+    "pipeline": {
+        "sampling": ["stride", "target_fps", "resize_width"],
+        "gating": ["enabled", "thumbnail_width", "wide_green_ratio", "closeup_green_ratio",
+                   "crowd_edge_density", "scene_cut_threshold", "max_replay_seconds"],
+        "detection": ["model", "confidence_threshold", "detect_every", "classes"],
+        "tracking": ["tracker", "track_thresh", "track_buffer", "match_thresh",
+                     "low_match_thresh", "optical_flow"],
+        "classification": ["model", "backend", "window_size", "stride", "thumbnail_size",
+                           "clip_mode", "clip_frames", "events"],
+        "aggregation": ["cooldown_period", "min_confidence", "fusion_window"],
+        "commentary": ["model", "max_tokens", "temperature", "backlog_threshold"],
+    },
+    "models": {
+        "yolo": ["path", "imgsz"],
+        "classifier": ["path", "architecture", "labels", "num_frames", "input_size"],
+    },
+}
 
 async def get_redis():
     global redis_client
     if redis_client is None:
-        redis_client = await redis.from_url("redis://localhost:6379", decode_responses=True)
+        redis_client = await redis.from_url(REDIS_URL, decode_responses=True)
     return redis_client
 
+async def get_redis_binary():
+    global redis_binary_client
+    if redis_binary_client is None:
+        redis_binary_client = await redis.from_url(REDIS_URL, decode_responses=False)
+    return redis_binary_client
+
+async def get_hub() -> CommentaryHub:
+    global commentary_hub
+    if commentary_hub is None:
+        commentary_hub = CommentaryHub(await get_redis_binary())
+    return commentary_hub
+
+async def get_uploads() -> ResumableUploads:
+    global resumable_uploads
+    if resumable_uploads is None:
+        resumable_uploads = ResumableUploads(await get_redis(), UPLOADS_DIR)
+    return resumable_uploads
+
+def settings_hash() -> str:
+    """Hash of the pipeline and model settings that shape a job's commentary"""
+    with open(CONFIGS_DIR / "pipeline.yaml", "r") as f:
+        pipeline = yaml.safe_load(f)["pipeline"]
+    models_path = CONFIGS_DIR / "models.yaml"
+    models = {}
+    if models_path.exists():
+        with open(models_path, "r") as f:
+            models = (yaml.safe_load(f) or {}).get("models", {})
+    
+    settings = {}
+    for name, config in (("pipeline", pipeline), ("models", models)):
+        for section, keys in RESULT_SETTINGS[name].items():
+            values = config.get(section) or {}
+            settings[f"{name}.{section}"] = {key: values[key] for key in keys if key in values}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+async def submit_job(job_id: str, file_path: Path, filename: str, sha256: str,
+                     parallel: bool | None = None) -> dict:
+    """
+    Send a fully received video to the Redis job stream
+    
+    Jobs are keyed by the video's SHA-256 and the settings hash. If a job
+    with the same key has already completed, its commentary is reused: the
+    new copy of the video is dropped and that job's ID is returned.
+    
+    Returns:
+        {"job_id": ..., "reused": bool}
+    """
+    r = await get_redis()
+    content_key = hashlib.sha256(f"{sha256}:{settings_hash()}".encode()).hexdigest()
+    
+    previous_job_id = await r.get(f"result:{content_key}")
+    if previous_job_id and await r.get(f"job:{previous_job_id}:status") == "completed":
+        file_path.unlink(missing_ok=True)
+        return {"job_id": previous_job_id, "reused": True}
+    
+    job = {
+        "job_id": job_id,
+        "video_path": str(file_path.absolute()),
+        "filename": filename,
+        "sha256": sha256,
+        "content_key": content_key
+    }
+    if parallel is not None:
+        job["parallel"] = parallel
+    # Store job status before a worker can pick the job up
+    await r.set(f"job:{job_id}:status", "queued")
+    await r.xadd(JOB_STREAM, {"job": json.dumps(job)})
+    return {"job_id": job_id, "reused": False}
+
 @router.post("/upload")
-async def upload_video(file: UploadFile = File(...)):
-    """Upload a video file for processing"""
+async def upload_video(file: UploadFile = File(...), parallel: bool | None = None):
+    """
+    Upload a video file for processing in a single request
+    
+    The file is copied to disk a chunk at a time, so memory use does not
+    grow with its size. Set parallel to split a whole match across the
+    worker's process pool instead of processing it front to back
+    (defaults to the worker config). Large files should use the
+    resumable /uploads endpoints instead.
+    """
     try:
         # Generate unique job ID
         job_id = str(uuid.uuid4())
+        filename = Path(file.filename or "video").name
         
-        # Save the uploaded file
-        file_path = UPLOADS_DIR / f"{job_id}_{file.filename}"
-        contents = await file.read()
+        # Stream the uploaded file to disk, hashing as it goes
+        file_path = UPLOADS_DIR / f"{job_id}_{filename}"
+        hasher = hashlib.sha256()
+        size = 0
         with open(file_path, "wb") as f:
-            f.write(contents)
+            while chunk := await file.read(CHUNK_SIZE):
+                await asyncio.to_thread(f.write, chunk)
+                hasher.update(chunk)
+                size += len(chunk)
         
-        # Send job to Redis queue with absolute path
-        r = await get_redis()
-        await r.lpush("video_queue", json.dumps({
-            "job_id": job_id,
-            "video_path": str(file_path.absolute()),
-            "filename": file.filename
-        }))
-        
-        # Store job status
-        await r.set(f"job:{job_id}:status", "queued")
+        submitted = await submit_job(job_id, file_path, filename, hasher.hexdigest(), parallel)
         
         return JSONResponse(
             content={
                 "message": "Video uploaded successfully",
-                "job_id": job_id,
-                "filename": file.filename,
-                "size": len(contents)
+                "job_id": submitted["job_id"],
+                "reused": submitted["reused"],
+                "filename": filename,
+                "size": size,
+                "sha256": hasher.hexdigest()
             }
         )
     except Exception as e:
@@ -60,11 +172,118 @@ async def upload_video(file: UploadFile = File(...)):
             content={"error": str(e)}
         )
 
+class UploadRequest(BaseModel):
+    filename: str
+    size: int
+    sha256: str | None = None
+    parallel: bool | None = None
+
+@router.post("/uploads", status_code=201)
+async def create_upload(upload: UploadRequest, response: Response):
+    """
+    Start a resumable upload
+    
+    Send the file with PATCH /uploads/{upload_id} requests whose
+    Upload-Offset header gives the byte offset of their body. After an
+    interruption, HEAD /uploads/{upload_id} returns the offset to resume
+    from. The job is queued when the last byte arrives and the SHA-256
+    (if given here) matches.
+    """
+    if upload.size <= 0:
+        return JSONResponse(status_code=400, content={"error": "size must be positive"})
+    
+    uploads = await get_uploads()
+    state = await uploads.create(upload.filename, upload.size, upload.sha256, upload.parallel)
+    response.headers["Location"] = f"/uploads/{state['upload_id']}"
+    response.headers["Upload-Offset"] = "0"
+    return {"upload_id": state["upload_id"], "offset": 0, "chunk_size": 8 * CHUNK_SIZE}
+
+@router.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    """Current offset of a resumable upload"""
+    uploads = await get_uploads()
+    state = await uploads.get(upload_id)
+    if state is None:
+        # Finished uploads report their full length
+        state = await uploads.result(upload_id)
+        if state is None:
+            return Response(status_code=404)
+        state = {"offset": state["offset"], "length": state["offset"]}
+    return Response(status_code=200, headers={
+        "Upload-Offset": str(state["offset"]),
+        "Upload-Length": str(state["length"]),
+        "Cache-Control": "no-store"
+    })
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload(upload_id: str, request: Request, upload_offset: int = Header(...)):
+    """
+    Append the request body to a resumable upload at Upload-Offset
+    
+    Returns the new offset, plus the job_id once the upload is complete.
+    A 409 response carries the server's offset in Upload-Offset. Repeating
+    the final request returns the same job_id.
+    """
+    uploads = await get_uploads()
+    state = await uploads.get(upload_id)
+    if state is None:
+        result = await uploads.result(upload_id)
+        if result is None:
+            return JSONResponse(status_code=404, content={"error": "Unknown upload"})
+        if result.get("pending"):
+            return JSONResponse(status_code=503, content={"error": "Upload is being finished"},
+                                headers={"Retry-After": "1"})
+        if "error" in result:
+            return JSONResponse(status_code=422, content={"error": result["error"]})
+        return JSONResponse(content=result, headers={"Upload-Offset": str(result["offset"])})
+    
+    try:
+        offset = await uploads.append(upload_id, state, upload_offset, request.stream())
+    except UploadConflict as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "offset": e.offset},
+                            headers={"Upload-Offset": str(e.offset)})
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    
+    content = {"upload_id": upload_id, "offset": offset}
+    if offset == state["length"]:
+        job_id = str(uuid.uuid4())
+        file_path = UPLOADS_DIR / f"{job_id}_{state['filename']}"
+        try:
+            sha256 = await uploads.finish(upload_id, state, file_path)
+        except UploadConflict as e:
+            return JSONResponse(status_code=409, content={"error": str(e), "offset": e.offset},
+                                headers={"Upload-Offset": str(e.offset)})
+        except ValueError as e:
+            return JSONResponse(status_code=422, content={"error": str(e)})
+        submitted = await submit_job(job_id, file_path, state["filename"], sha256, state["parallel"])
+        content.update({"filename": state["filename"], "sha256": sha256, **submitted})
+        await uploads.store_result(upload_id, content)
+    
+    return JSONResponse(content=content, headers={"Upload-Offset": str(offset)})
+
+def parse_offset(offset: str | None) -> tuple | None:
+    """Commentary log offset (a Redis stream ID) as a comparable tuple"""
+    try:
+        milliseconds, sequence = offset.split("-")
+        return int(milliseconds), int(sequence)
+    except (AttributeError, ValueError):
+        return None
+
 @router.websocket("/ws/commentary")
 async def websocket_commentary(websocket: WebSocket):
-    """WebSocket endpoint for real-time commentary streaming"""
+    """
+    WebSocket endpoint for real-time commentary streaming
+    
+    The client sends {"job_id": ..., "last_seen": offset}. Records logged
+    after last_seen (or all of them, if omitted) are replayed from the
+    job's commentary log, then the connection follows the live channel.
+    Every complete line and the final 'end' record carry their log offset,
+    which a reconnecting client sends back as last_seen.
+    """
     await websocket.accept()
-    active_connections.append(websocket)
+    hub = await get_hub()
+    viewer = None
     
     try:
         # Wait for job_id from client
@@ -76,28 +295,70 @@ async def websocket_commentary(websocket: WebSocket):
             await websocket.send_json({"error": "No job_id provided"})
             return
         
-        # Subscribe to Redis pub/sub for this job
-        r = await get_redis()
-        pubsub = r.pubsub()
-        await pubsub.subscribe(f"commentary:{job_id}")
+        # Follow the job before reading the log, so nothing falls between the two
+        viewer = await hub.join(job_id)
+        r = await get_redis_binary()
         
         await websocket.send_json({
             "status": "connected",
             "message": "Listening for commentary..."
         })
         
-        # Listen for commentary updates
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                commentary_data = json.loads(message["data"])
-                await websocket.send_json(commentary_data)
+        # Replay what the client missed, a page at a time
+        last_seen = job_data.get("last_seen")
+        replayed = parse_offset(last_seen)
+        start = f"({last_seen}" if replayed else "-"
+        ended = False
+        while True:
+            entries = await r.xrange(f"job:{job_id}:commentary", min=start, count=REPLAY_PAGE_SIZE)
+            for entry_id, fields in entries:
+                record = json.loads(fields[b"data"])
+                record["offset"] = entry_id.decode()
+                # Audio is only published live; the client speaks replayed lines itself
+                if record.get("type") == "complete":
+                    record["audio"] = False
+                ended = record.get("type") == "end"
+                replayed = parse_offset(record["offset"])
+                await websocket.send_text(json.dumps(record))
+            if len(entries) < REPLAY_PAGE_SIZE:
+                break
+            start = f"({entries[-1][0].decode()}"
+        
+        # Forward live commentary and audio, as published
+        while not ended:
+            message = await viewer.get()
+            if message is None:
+                # Too far behind; the client reconnects and replays from the log
+                await websocket.close(code=1013)
+                return
+            kind, payload = message
+            if kind == "bytes":
+                await websocket.send_bytes(payload)
+                continue
+            
+            # Only logged records carry an offset; deltas are forwarded without parsing
+            if replayed is not None and '"offset"' in payload:
+                # Records published while the log was being replayed arrive twice
+                record = json.loads(payload)
+                offset = parse_offset(record.get("offset"))
+                if offset <= replayed:
+                    continue
+                replayed = None
+                ended = record.get("type") == "end"
+            elif '"type": "end"' in payload:
+                ended = True
+            await websocket.send_text(payload)
+        
+        # The job is over; nothing more will be published
+        await websocket.close()
             
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+    finally:
+        if viewer is not None:
+            await hub.leave(viewer)
 
 @router.get("/status/{job_id}")
 async def get_job_status(job_id: str):
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+# Bytes read and hashed at a time; memory use per upload stays around this
+CHUNK_SIZE = 1024 * 1024
+
+class UploadConflict(Exception):
+    """The client's offset does not match the server's, or another request holds the upload"""
+    
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+class UploadTooLarge(Exception):
+    """More bytes were sent than the declared upload length"""
+
+class ResumableUploads:
+    """
+    Offset-based resumable uploads streamed to disk
+    
+    Upload metadata lives in the Redis hash upload:{id}; the partial file
+    on disk is the source of truth for the offset, so an interrupted PATCH
+    resumes from whatever was written. Data is hashed with SHA-256 as it
+    arrives; if this process did not see the earlier bytes (restart or a
+    different API instance), the partial file is re-hashed once first.
+    
+    Once an upload is finished, its outcome is kept in upload:{id}:result
+    for result_ttl seconds, so a client whose last reply was lost can ask
+    again instead of getting a 404.
+    """
+    
+    def __init__(self, redis_client, upload_dir: Path, ttl: int = 24 * 3600, result_ttl: int = 3600):
+        self.redis = redis_client
+        self.partial_dir = upload_dir / ".partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.result_ttl = result_ttl
+        # upload_id -> (offset hashed so far, running hash)
+        self._hashers: Dict[str, tuple] = {}
+    
+    async def create(self, filename: str, length: int, sha256: Optional[str] = None,
+                     parallel: Optional[bool] = None) -> Dict:
+        upload_id = uuid.uuid4().hex
+        state = {
+            "filename": Path(filename).name or "video",
+            "length": length,
+            "sha256": (sha256 or "").lower(),
+            "parallel": "" if parallel is None else int(parallel)
+        }
+        self._path(upload_id).touch()
+        await self.redis.hset(f"upload:{upload_id}", mapping=state)
+        await self.redis.expire(f"upload:{upload_id}", self.ttl)
+        return {"upload_id": upload_id, "offset": 0, **state}
+    
+    async def get(self, upload_id: str) -> Optional[Dict]:
+        state = await self.redis.hgetall(f"upload:{upload_id}")
+        if not state:
+            return None
+        state["length"] = int(state["length"])
+        state["parallel"] = None if state["parallel"] == "" else bool(int(state["parallel"]))
+        state["offset"] = self.offset(upload_id)
+        return state
+    
+    def offset(self, upload_id: str) -> int:
+        path = self._path(upload_id)
+        return path.stat().st_size if path.exists() else 0
+    
+    async def append(self, upload_id: str, state: Dict, offset: int,
+                     chunks: AsyncIterator[bytes]) -> int:
+        """
+        Append a request body at offset
+        
+        Args:
+            upload_id: Upload to append to
+            state: Upload state from get()
+            offset: Offset the client believes it is writing at
+            chunks: Request body stream
+            
+        Returns:
+            New offset
+        """
+        lock = f"upload:{upload_id}:lock"
+        if not await self.redis.set(lock, 1, nx=True, ex=300):
+            raise UploadConflict("Upload is busy", self.offset(upload_id))
+        try:
+            current = self.offset(upload_id)
+            if offset != current:
+                raise UploadConflict("Offset mismatch", current)
+            
+            hasher = await self._hasher(upload_id, current)
+            with open(self._path(upload_id), "ab") as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if current + len(chunk) > state["length"]:
+                        raise UploadTooLarge(f"Upload exceeds its length of {state['length']} bytes")
+                    await asyncio.to_thread(f.write, chunk)
+                    hasher.update(chunk)
+                    current += len(chunk)
+                    self._hashers[upload_id] = (current, hasher)
+            await self.redis.expire(f"upload:{upload_id}", self.ttl)
+            return current
+        finally:
+            await self.redis.delete(lock)
+    
+    async def finish(self, upload_id: str, state: Dict, destination: Path) -> str:
+        """
+        Verify a complete upload and move it into place
+        
+        Returns:
+            Hex SHA-256 of the file
+            
+        Raises:
+            UploadConflict: Another request already finished the upload
+            ValueError: The digest does not match the one given at creation
+        """
+        # Deleting the state claims the upload, so it is only queued once
+        if not await self.redis.delete(f"upload:{upload_id}"):
+            raise UploadConflict("Upload already finished", state["length"])
+        # Repeated requests are asked to retry until the result is stored
+        await self.store_result(upload_id, {"pending": True, "offset": state["length"]})
+        hasher = await self._hasher(upload_id, state["length"])
+        digest = hasher.hexdigest()
+        path = self._path(upload_id)
+        self._hashers.pop(upload_id, None)
+        if state["sha256"] and state["sha256"] != digest:
+            path.unlink(missing_ok=True)
+            error = f"SHA-256 mismatch: expected {state['sha256']}, got {digest}"
+            await self.store_result(upload_id, {"error": error, "offset": state["length"]})
+            raise ValueError(error)
+        path.replace(destination)
+        return digest
+    
+    async def store_result(self, upload_id: str, result: Dict):
+        """Remember what finishing the upload produced (e.g. its job_id)"""
+        await self.redis.set(f"upload:{upload_id}:result", json.dumps(result), ex=self.result_ttl)
+    
+    async def result(self, upload_id: str) -> Optional[Dict]:
+        """Outcome of a finished upload; {"pending": True} while it is being finished"""
+        result = await self.redis.get(f"upload:{upload_id}:result")
+        return json.loads(result) if result is not None else None
+    
+    async def _hasher(self, upload_id: str, offset: int):
+        hashed, hasher = self._hashers.get(upload_id, (0, None))
+        if hasher is None or hashed != offset:
+            hasher = await asyncio.to_thread(self._hash_file, self._path(upload_id), offset)
+            self._hashers[upload_id] = (offset, hasher)
+        return hasher
+    
+    @staticmethod
+    def _hash_file(path: Path, length: int):
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        return hasher
+    
+    def _path(self, upload_id: str) -> Path:
+        return self.partial_dir / upload_id
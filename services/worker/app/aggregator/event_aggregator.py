@@ -1,30 +1,47 @@
 from typing import List, Dict, Optional
-import time
 
 class EventAggregator:
-    """Aggregate and filter events to prevent duplicate commentary"""
+    """
+    Aggregate and filter events to prevent duplicate commentary
+    
+    All timing is in video time, so the output does not depend on how
+    fast frames are processed. Detections of the same event type within
+    fusion_window seconds of each other are fused into one candidate that
+    keeps the highest-confidence detection; a candidate is released once
+    video time has moved past its window, subject to cooldown_period.
+    """
     
     def __init__(self, config: Dict):
         self.config = config
         self.cooldown_period = config.get('cooldown_period', 3.0)
         self.min_confidence = config.get('min_confidence', 0.6)
+        self.fusion_window = config.get('fusion_window', 2.0)
+        # Used only when callers do not pass a video timestamp
+        self.fps = config.get('fps', 25.0)
+        self.reset()
+    
+    def reset(self):
+        """Clear all state (call between videos)"""
         self.last_event_time = {}
+        self.pending = {}
     
-    def process(self, events: List[Dict], frame_id: int) -> Optional[Dict]:
+    def process(self, events: List[Dict], frame_id: int, timestamp: Optional[float] = None) -> List[Dict]:
         """
         Process and aggregate events
         
         Args:
             events: List of detected events
             frame_id: Current frame ID
+            timestamp: Video time of the frame in seconds (defaults to frame_id / fps)
             
         Returns:
-            Aggregated event if significant, None otherwise
+            Aggregated events whose fusion window has closed, oldest first
         """
-        if not events:
-            return None
+        if timestamp is None:
+            timestamp = frame_id / self.fps
         
-        current_time = time.time()
+        # Release candidates whose window has closed before this frame
+        released = self._release(lambda candidate: timestamp > candidate['window_end'])
         
         for event in events:
             event_type = event['event_type']
@@ -34,19 +51,56 @@ class EventAggregator:
             if confidence < self.min_confidence:
                 continue
             
+            candidate = self.pending.get(event_type)
+            if candidate is None:
+                self.pending[event_type] = {
+                    'event_type': event_type,
+                    'confidence': confidence,
+                    'description': event.get('description', ''),
+                    'frame_id': frame_id,
+                    'timestamp': timestamp,
+                    'window_end': timestamp + self.fusion_window
+                }
+            elif confidence > candidate['confidence']:
+                # Same event seen again: keep the most confident detection
+                candidate.update({
+                    'confidence': confidence,
+                    'description': event.get('description', ''),
+                    'frame_id': frame_id,
+                    'timestamp': timestamp
+                })
+        
+        return released
+    
+    def flush(self) -> List[Dict]:
+        """Release all pending candidates (call at the end of a video)"""
+        return self._release(lambda candidate: True)
+    
+    def _release(self, ready) -> List[Dict]:
+        released = []
+        for event_type in [t for t, candidate in self.pending.items() if ready(candidate)]:
+            candidate = self.pending.pop(event_type)
+            
             # Check cooldown
-            last_time = self.last_event_time.get(event_type, 0)
-            if current_time - last_time < self.cooldown_period:
+            last_time = self.last_event_time.get(event_type)
+            if last_time is not None and candidate['timestamp'] - last_time < self.cooldown_period:
                 continue
             
             # Event is significant
-            self.last_event_time[event_type] = current_time
-            
-            return {
-                'event_type': event_type,
-                'confidence': confidence,
-                'frame_id': frame_id,
-                'timestamp': current_time
-            }
+            self.last_event_time[event_type] = candidate['timestamp']
+            released.append({k: v for k, v in candidate.items() if k != 'window_end'})
         
-        return None
+        released.sort(key=lambda event: event['timestamp'])
+        return released
+    
+    def state_dict(self) -> Dict:
+        """JSON-serialisable snapshot of the aggregator state"""
+        return {
+            'last_event_time': dict(self.last_event_time),
+            'pending': {t: dict(candidate) for t, candidate in self.pending.items()}
+        }
+    
+    def load_state_dict(self, state: Dict):
+        """Restore state produced by state_dict()"""
+        self.last_event_time = dict(state.get('last_event_time', {}))
+        self.pending = {t: dict(candidate) for t, candidate in state.get('pending', {}).items()}
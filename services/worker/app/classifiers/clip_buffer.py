@@ -0,0 +1,55 @@
+import math
+import cv2
+import numpy as np
+
+class ClipBuffer:
+    """Fixed-capacity ring buffer of downscaled frames in preallocated storage"""
+    
+    def __init__(self, capacity: int, width: int = 320, height: int = 180):
+        self.capacity = capacity
+        self.width = width
+        self.height = height
+        self.storage = np.zeros((capacity, height, width, 3), dtype=np.uint8)
+        self.next = 0
+        self.count = 0
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def is_full(self) -> bool:
+        return self.count == self.capacity
+    
+    def clear(self):
+        self.next = 0
+        self.count = 0
+    
+    def append(self, frame: np.ndarray):
+        """Downscale a frame into the next slot, overwriting the oldest when full"""
+        cv2.resize(frame, (self.width, self.height), dst=self.storage[self.next],
+                   interpolation=cv2.INTER_AREA)
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+    
+    def frames(self, n: int = None) -> np.ndarray:
+        """
+        Copy of the buffered frames, oldest first
+        
+        Args:
+            n: If given, pick n frames evenly spaced across the window
+        """
+        order = (self.next - self.count + np.arange(self.count)) % self.capacity
+        if n is not None and self.count > n:
+            order = order[np.linspace(0, self.count - 1, n).round().astype(int)]
+        return self.storage[order]
+    
+    @staticmethod
+    def tile(frames: np.ndarray, columns: int = None) -> np.ndarray:
+        """Arrange frames left-to-right, top-to-bottom in a single grid image"""
+        n, height, width = frames.shape[:3]
+        columns = columns or math.ceil(math.sqrt(n))
+        rows = math.ceil(n / columns)
+        grid = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        for i, frame in enumerate(frames):
+            row, column = divmod(i, columns)
+            grid[row * height:(row + 1) * height, column * width:(column + 1) * width] = frame
+        return grid
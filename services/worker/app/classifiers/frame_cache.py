@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.utils.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+def dhash(frame: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Difference hash of a frame
+    
+    The frame is reduced to a (hash_size + 1) x hash_size grayscale
+    thumbnail and each bit records whether a pixel is brighter than its
+    right-hand neighbour, so near-identical frames get hashes a few bits apart.
+    """
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+class FrameHashCache:
+    """
+    LRU cache of classification results keyed by perceptual frame hash
+    
+    A lookup hits when a cached hash is within max_distance bits (Hamming
+    distance) of the frame's hash. An optional Redis tier shares exact-hash
+    entries between jobs and workers. Requests still in flight are tracked
+    too, so a similar frame can wait for one instead of making its own.
+    """
+    
+    def __init__(self, config: Dict, redis_client=None):
+        self.config = config
+        self.max_entries = config.get('max_entries', 2048)
+        self.max_distance = config.get('max_distance', 4)
+        self.ttl = config.get('ttl', 3600)
+        self.prefix = config.get('prefix', 'vlmcache')
+        self.redis = redis_client
+        self.entries: OrderedDict = OrderedDict()
+        # Hash -> future of the result of a request in flight
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def get_local(self, frame_hash: int) -> Optional[List[Dict]]:
+        """Look up the closest cached result in this process"""
+        result = self._lookup(frame_hash)
+        self._count(result)
+        return result
+    
+    async def get(self, frame_hash: int) -> Optional[List[Dict]]:
+        """Look up a result locally, then in the shared Redis tier"""
+        result = self._lookup(frame_hash)
+        if result is None and self.redis is not None:
+            try:
+                payload = await self.redis.get(self._redis_key(frame_hash))
+            except Exception as e:
+                log.warning("Frame cache Redis error: %s", e)
+                payload = None
+            if payload is not None:
+                result = json.loads(payload)
+                self._store(frame_hash, result)
+        
+        self._count(result)
+        return result
+    
+    async def wait_pending(self, frame_hash: int) -> Optional[List[Dict]]:
+        """
+        Wait for the result of an in-flight request for a similar frame
+        
+        Returns:
+            The result, or None if no such request is in flight or it failed
+        """
+        closest = self._closest(self.pending, frame_hash)
+        if closest is None:
+            return None
+        metrics.inc('classifier_cache_total', result='coalesced')
+        return await asyncio.shield(self.pending[closest])
+    
+    def begin(self, frame_hash: int):
+        """Mark a request for this frame as in flight"""
+        self.pending[frame_hash] = asyncio.get_running_loop().create_future()
+    
+    def end(self, frame_hash: int, result: Optional[List[Dict]]):
+        """Hand a finished request's result (None if it failed) to the frames waiting for it"""
+        future = self.pending.pop(frame_hash, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+    
+    def _lookup(self, frame_hash: int) -> Optional[List[Dict]]:
+        closest = self._closest(self.entries, frame_hash)
+        if closest is None:
+            return None
+        self.entries.move_to_end(closest)
+        return self.entries[closest]
+    
+    def _closest(self, hashes: Dict, frame_hash: int) -> Optional[int]:
+        """The key of hashes nearest to frame_hash, if within max_distance"""
+        if frame_hash in hashes:
+            return frame_hash
+        closest, best = None, self.max_distance + 1
+        if self.max_distance > 0:
+            for cached_hash in hashes:
+                distance = (cached_hash ^ frame_hash).bit_count()
+                if distance < best:
+                    best, closest = distance, cached_hash
+        return closest
+    
+    def _count(self, result: Optional[List[Dict]]):
+        if result is None:
+            self.misses += 1
+            metrics.inc('classifier_cache_total', result='miss')
+        else:
+            self.hits += 1
+            metrics.inc('classifier_cache_total', result='hit')
+    
+    def put_local(self, frame_hash: int, result: List[Dict]):
+        """Store a result in this process"""
+        self._store(frame_hash, result)
+    
+    async def put(self, frame_hash: int, result: List[Dict]):
+        """Store a result locally and in the shared Redis tier"""
+        self._store(frame_hash, result)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._redis_key(frame_hash), json.dumps(result), ex=self.ttl)
+        except Exception as e:
+            log.warning("Frame cache Redis error: %s", e)
+    
+    def _store(self, frame_hash: int, result: List[Dict]):
+        self.entries[frame_hash] = result
+        self.entries.move_to_end(frame_hash)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def _redis_key(self, frame_hash: int) -> str:
+        return f"{self.prefix}:{frame_hash:016x}"
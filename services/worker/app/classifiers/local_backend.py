@@ -0,0 +1,141 @@
+import asyncio
+import cv2
+import numpy as np
+import torch
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Kinetics-400 normalisation used by torchvision's video models
+KINETICS_MEAN = np.array([0.43216, 0.394666, 0.37645], dtype=np.float32)
+KINETICS_STD = np.array([0.22803, 0.22145, 0.216989], dtype=np.float32)
+
+class LocalClipClassifier:
+    """
+    Local CPU clip classifier (TorchScript, torch checkpoint or ONNX)
+    
+    Takes clips of num_frames thumbnails and returns one label per clip.
+    predict_async() collects clips from concurrent callers and runs them
+    as a single batch of up to batch_size, waiting at most max_batch_wait
+    seconds for a batch to fill.
+    """
+    
+    def __init__(self, model_config: Dict, labels: List[str]):
+        self.model_config = model_config
+        self.labels = model_config.get('labels', labels)
+        self.batch_size = model_config.get('batch_size', 8)
+        self.max_batch_wait = model_config.get('max_batch_wait', 0.05)
+        self.num_frames = model_config.get('num_frames', 16)
+        self.input_size = model_config.get('input_size', 112)
+        
+        device = model_config.get('device', 'cpu')
+        if device.startswith('cuda') and not torch.cuda.is_available():
+            device = 'cpu'
+        self.device = torch.device(device)
+        
+        self.model = None
+        self.session = None
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._flush_handle = None
+        self._lock = None
+        self.load_model(model_config.get('path', 'models/video_classifier.pth'))
+    
+    def load_model(self, model_path: str):
+        """Load a TorchScript/torch model or an ONNX Runtime session"""
+        if Path(model_path).suffix == '.onnx':
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            threads = self.model_config.get('num_threads')
+            if threads:
+                options.intra_op_num_threads = threads
+            providers = ['CPUExecutionProvider']
+            if self.model_config.get('device', 'cpu').startswith('cuda'):
+                providers.insert(0, 'CUDAExecutionProvider')
+            self.session = ort.InferenceSession(
+                model_path,
+                sess_options=options,
+                providers=[p for p in providers if p in ort.get_available_providers()]
+            )
+        else:
+            try:
+                self.model = torch.jit.load(model_path, map_location=self.device)
+            except RuntimeError:
+                checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
+                if isinstance(checkpoint, dict):
+                    # Plain state dict: assume torchvision's R(2+1)D-style architecture
+                    from torchvision.models import video
+                    architecture = getattr(video, self.model_config.get('architecture', 'r3d_18'))
+                    self.model = architecture(num_classes=len(self.labels))
+                    self.model.load_state_dict(checkpoint.get('state_dict', checkpoint))
+                else:
+                    self.model = checkpoint
+            self.model.to(self.device).eval()
+        print(f"Loaded clip classifier: {model_path}")
+    
+    def preprocess(self, clips: np.ndarray) -> np.ndarray:
+        """Convert BxTxHxWx3 BGR uint8 clips to a normalised BxCxTxHxW float batch"""
+        b, t = clips.shape[:2]
+        frames = np.stack([
+            cv2.resize(frame, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+            for frame in clips.reshape(-1, *clips.shape[2:])
+        ])
+        frames = (frames[..., ::-1].astype(np.float32) / 255.0 - KINETICS_MEAN) / KINETICS_STD
+        frames = frames.reshape(b, t, self.input_size, self.input_size, 3)
+        return np.ascontiguousarray(frames.transpose(0, 4, 1, 2, 3))
+    
+    def predict(self, clips: np.ndarray) -> List[Tuple[str, float]]:
+        """
+        Classify a batch of clips
+        
+        Args:
+            clips: BxTxHxWx3 BGR uint8 array
+            
+        Returns:
+            (label, confidence) for each clip
+        """
+        inputs = self.preprocess(clips)
+        if self.session is not None:
+            logits = self.session.run(None, {self.session.get_inputs()[0].name: inputs})[0]
+            logits = torch.from_numpy(logits)
+        else:
+            with torch.inference_mode():
+                logits = self.model(torch.from_numpy(inputs).to(self.device)).cpu()
+        
+        confidences, indices = torch.softmax(logits.float(), dim=1).max(dim=1)
+        return [(self.labels[i], float(c)) for i, c in zip(indices.tolist(), confidences.tolist())]
+    
+    async def predict_async(self, clip: np.ndarray) -> Tuple[str, float]:
+        """Queue one TxHxWx3 clip for the next batch and wait for its label"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((clip, future))
+        
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_batch_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            asyncio.get_running_loop().create_task(self._run_batch(pending))
+    
+    async def _run_batch(self, pending: List[Tuple[np.ndarray, asyncio.Future]]):
+        # One batch at a time; concurrent batches would only contend for the cores
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                results = await asyncio.to_thread(self.predict, np.stack([clip for clip, _ in pending]))
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
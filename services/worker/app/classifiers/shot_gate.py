@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+from typing import Dict, Optional
+
+class ShotGate:
+    """
+    Cheap broadcast shot-type classifier used to skip frames that do not show live play
+    
+    Works on a small thumbnail with a handful of array features: the share
+    of pitch-green pixels, edge density, and the grayscale histogram
+    distance to the previous sampled frame (scene cuts). A graphics frame
+    cut in between two pitch shots is treated as a replay wipe, which
+    toggles replay mode.
+    """
+    
+    SHOT_TYPES = ('wide', 'close_up', 'crowd', 'graphics')
+    
+    def __init__(self, config: Dict):
+        self.config = config
+        self.enabled = config.get('enabled', True)
+        self.thumbnail_width = config.get('thumbnail_width', 160)
+        self.wide_green_ratio = config.get('wide_green_ratio', 0.35)
+        self.closeup_green_ratio = config.get('closeup_green_ratio', 0.08)
+        self.crowd_edge_density = config.get('crowd_edge_density', 0.15)
+        self.scene_cut_threshold = config.get('scene_cut_threshold', 0.5)
+        self.max_replay_seconds = config.get('max_replay_seconds', 20.0)
+        self.reset()
+    
+    def reset(self):
+        """Forget the previous frame and replay state (call between videos)"""
+        self.prev_hist: Optional[np.ndarray] = None
+        self.in_replay = False
+        self.pending_wipe = False
+        self.replay_started = 0.0
+    
+    def classify(self, frame: np.ndarray, timestamp: float) -> Dict:
+        """
+        Classify the shot type of a frame
+        
+        Args:
+            frame: Current video frame (BGR)
+            timestamp: Video time of the frame in seconds
+            
+        Returns:
+            Dict with shot_type, scene_cut, replay and live flags
+        """
+        if not self.enabled:
+            return {'shot_type': 'wide', 'scene_cut': False, 'replay': False, 'live': True}
+        
+        height, width = frame.shape[:2]
+        scale = self.thumbnail_width / width
+        thumbnail = cv2.resize(frame, (self.thumbnail_width, max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA).astype(np.int16)
+        blue, green, red = thumbnail[..., 0], thumbnail[..., 1], thumbnail[..., 2]
+        gray = (0.114 * blue + 0.587 * green + 0.299 * red).astype(np.uint8)
+        
+        # Share of grass-coloured pixels
+        pitch = (green > 50) & (green * 10 > red * 11) & (green * 10 > blue * 11)
+        green_ratio = float(pitch.mean())
+        
+        # Share of strong horizontal gradients (crowds are highly textured)
+        edges = np.abs(np.diff(gray.astype(np.int16), axis=1)) > 24
+        edge_density = float(edges.mean())
+        
+        # Histogram distance to the previous frame, in [0, 1]
+        hist = np.bincount(gray.ravel() >> 3, minlength=32) / gray.size
+        scene_cut = self.prev_hist is not None and \
+            0.5 * float(np.abs(hist - self.prev_hist).sum()) > self.scene_cut_threshold
+        self.prev_hist = hist
+        
+        if green_ratio >= self.wide_green_ratio:
+            shot_type = 'wide'
+        elif green_ratio >= self.closeup_green_ratio:
+            shot_type = 'close_up'
+        elif edge_density >= self.crowd_edge_density:
+            shot_type = 'crowd'
+        else:
+            shot_type = 'graphics'
+        
+        # Replays are bracketed by wipes: a full-screen graphic cut in
+        # between two pitch shots
+        if self.pending_wipe and scene_cut and shot_type == 'wide':
+            self.in_replay = not self.in_replay
+            self.replay_started = timestamp
+        elif self.in_replay and timestamp - self.replay_started > self.max_replay_seconds:
+            self.in_replay = False
+        self.pending_wipe = scene_cut and shot_type == 'graphics'
+        
+        return {
+            'shot_type': shot_type,
+            'scene_cut': scene_cut,
+            'replay': self.in_replay,
+            'live': shot_type == 'wide' and not self.in_replay
+        }
@@ -1,74 +1,303 @@
+import asyncio
+import copy
+import json
+import logging
 import numpy as np
-from typing import List, Dict
-import torch
+from typing import Awaitable, List, Dict, Optional
 import base64
 import cv2
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
+from app.utils.detections import Detections
+from app.classifiers.frame_cache import FrameHashCache, dhash
+from app.classifiers.clip_buffer import ClipBuffer
+from app.utils.metrics import metrics
+from pathlib import Path
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 class VideoClassifier:
     """Classifier for football event recognition using GPT-4 Vision"""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, model_config: Optional[Dict] = None):
         self.config = config
+        self.model_config = model_config or {}
         self.event_types = config.get('events', [])
         self.window_size = config.get('window_size', 16)
-        self.frame_buffer = []
+        self.stride = config.get('stride', 8)
+        # Recent frames, kept as thumbnails in a preallocated ring buffer
+        width, height = config.get('thumbnail_size', [320, 180])
+        self.frame_buffer = ClipBuffer(self.window_size, width, height)
+        # 'frame' sends each frame on its own; 'grid' and 'multi' send
+        # clip_frames buffered frames as one request every stride frames
+        self.clip_mode = config.get('clip_mode', 'frame')
+        self.clip_frames = config.get('clip_frames', 4)
+        self._frames_since_request = 0
+        # Bound on concurrent VLM requests made through classify_async
+        self.max_in_flight = config.get('max_in_flight', 4)
+        self._semaphore = None
         
-        # Initialize OpenAI client for GPT-4 Vision
+        # Reuse VLM results for perceptually similar frames
+        cache_config = config.get('cache', {})
+        self.cache = FrameHashCache(cache_config) if cache_config.get('enabled', False) else None
+        
+        # 'vlm', 'local' or 'heuristic'; 'auto' prefers the VLM, then a local model
         api_key = os.getenv('OPENAI_API_KEY')
-        if api_key:
-            self.client = OpenAI(api_key=api_key)
+        self.backend = config.get('backend', 'auto')
+        if self.backend == 'auto':
+            if api_key:
+                self.backend = 'vlm'
+            elif Path(self.model_config.get('path', '')).is_file():
+                self.backend = 'local'
+            else:
+                self.backend = 'heuristic'
+        
+        # Initialize OpenAI client for GPT-4 Vision
+        base_url = config.get('base_url') or os.getenv('OPENAI_BASE_URL')
+        self.client = None
+        self.async_client = None
+        self.use_vlm = False
+        self.local_model = None
+        if self.backend == 'vlm' and api_key:
+            # Only imported when used; it adds noticeably to worker start-up
+            from openai import OpenAI, AsyncOpenAI
+            self.client = OpenAI(api_key=api_key, base_url=base_url)
+            self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
             self.use_vlm = True
             print("GPT-4 Vision enabled for event classification")
+        elif self.backend == 'local':
+            self._load_model()
+            print("Local clip classifier enabled for event classification")
         else:
-            self.client = None
-            self.use_vlm = False
             print("Using heuristic-based classification (no OpenAI API key)")
     
+    def reset(self):
+        """Forget buffered frames, e.g. for a new video"""
+        self.frame_buffer.clear()
+        self._frames_since_request = 0
+    
+    def fork(self) -> 'VideoClassifier':
+        """
+        Classifier for another job that shares this one's models, clients,
+        cache and request limit but has its own frame window
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        forked = copy.copy(self)
+        width, height = self.config.get('thumbnail_size', [320, 180])
+        forked.frame_buffer = ClipBuffer(self.window_size, width, height)
+        forked._frames_since_request = 0
+        return forked
+    
+    @property
+    def queue_size(self) -> int:
+        """
+        Frames whose classification may be pending at once
+        
+        max_in_flight for the VLM. The local model sees one window every
+        stride frames, so filling a batch takes stride x batch_size frames;
+        pending frames only hold thumbnails, so this is cheap.
+        """
+        if self.local_model is not None:
+            return max(self.max_in_flight, self.stride * self.local_model.batch_size)
+        return self.max_in_flight
+    
+    def attach_redis(self, redis_client):
+        """Enable the shared Redis tier of the result cache, if configured"""
+        if self.cache is not None and self.cache.config.get('shared', False):
+            self.cache.redis = redis_client
+    
     def _load_model(self):
         """Load video classification model"""
-        pass
+        from app.classifiers.local_backend import LocalClipClassifier
+        self.local_model = LocalClipClassifier(self.model_config, self.event_types)
     
-    def classify(self, frame: np.ndarray, tracks: List[Dict]) -> List[Dict]:
+    def classify(self, frame: np.ndarray, tracks: Detections) -> List[Dict]:
         """
         Classify events in the current frame using GPT-4 Vision
         
         Args:
             frame: Current video frame
-            tracks: List of tracked objects
+            tracks: Tracked objects
             
         Returns:
             List of detected events
         """
-        self.frame_buffer.append({
-            'frame': frame,
-            'tracks': tracks
-        })
-        
-        # Keep buffer size fixed
-        if len(self.frame_buffer) > self.window_size:
-            self.frame_buffer.pop(0)
+        self._buffer_frame(frame)
         
         # Use GPT-4 Vision if available
         if self.use_vlm and self.client:
-            return self._classify_with_vlm(frame, tracks)
+            images = self._vlm_images(frame)
+            if images is None:
+                return []
+            return self._classify_with_vlm(images, tracks)
+        elif self.local_model is not None:
+            if not self._window_due():
+                return []
+            clip = self.frame_buffer.frames(self.local_model.num_frames)
+            label, confidence = self.local_model.predict(clip[None])[0]
+            return self._local_events(label, confidence, len(self.frame_buffer))
         else:
             # Fallback to simple heuristics
             return self._classify_heuristic(tracks)
     
-    def _classify_with_vlm(self, frame: np.ndarray, tracks: List[Dict]) -> List[Dict]:
-        """Use GPT-4 Vision to classify football events"""
+    def classify_async(self, frame: np.ndarray, tracks: Detections) -> Awaitable[List[Dict]]:
+        """
+        Start classifying a frame without blocking the event loop
+        
+        The frame is buffered and the images to classify are taken before
+        this returns, so calls must be made in frame order. The returned
+        awaitable keeps only those images (the downscaled clip for the local
+        model), not the frame. At most max_in_flight VLM requests run at
+        once and the rest wait their turn.
+        
+        Args:
+            frame: Current video frame
+            tracks: Tracked objects
+            
+        Returns:
+            Awaitable list of detected events
+        """
+        self._buffer_frame(frame)
+        position = len(self.frame_buffer)
+        
+        if self.local_model is not None:
+            if not self._window_due():
+                return self._resolved([])
+            clip = self.frame_buffer.frames(self.local_model.num_frames)
+            return self._classify_local_async(clip, position, tracks)
+        
+        if not (self.use_vlm and self.async_client):
+            return self._resolved(self._classify_heuristic(tracks))
+        
+        images = self._vlm_images(frame)
+        if images is None:
+            return self._resolved([])
+        return self._classify_vlm_async(images, position, self._classify_heuristic(tracks))
+    
+    @staticmethod
+    async def _resolved(events: List[Dict]) -> List[Dict]:
+        return events
+    
+    async def _classify_vlm_async(self, images: List[np.ndarray], position: int,
+                                  heuristic_events: List[Dict]) -> List[Dict]:
+        """Classify images with the VLM, falling back to the heuristic events"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        
+        events = None
+        requested = False
         try:
-            # Encode frame to base64
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
+            if self.cache is not None:
+                frame_hash = await asyncio.to_thread(self._images_hash, images)
+                cached = await self.cache.get(frame_hash)
+                if cached is None:
+                    # A similar frame may already be on its way to the VLM
+                    cached = await self.cache.wait_pending(frame_hash)
+                if cached is not None:
+                    return self._restamp(cached, position)
+                self.cache.begin(frame_hash)
+                requested = True
+            
+            messages = await asyncio.to_thread(self._build_vlm_messages, images)
+            async with self._semaphore:
+                metrics.inc('external_api_requests_total', api='vlm')
+                with metrics.timer('external_api_seconds', api='vlm'):
+                    response = await self.async_client.chat.completions.create(
+                        model="gpt-4o",
+                        messages=messages,
+                        max_tokens=150,
+                        temperature=0.3
+                    )
+            events = self._parse_vlm_response(response.choices[0].message.content, position)
             
-            # Prepare prompt for GPT-4 Vision
-            prompt = """You are an expert football analyst. Analyze this video frame from a football match.
+            if self.cache is not None:
+                await self.cache.put(frame_hash, events)
+            return events
+        except Exception as e:
+            metrics.inc('external_api_errors_total', api='vlm')
+            log.warning("GPT-4 Vision error: %s", e)
+            # Fallback to heuristics
+            return heuristic_events
+        finally:
+            if requested:
+                # Frames waiting on a failed request make their own
+                self.cache.end(frame_hash, events)
+    
+    def _buffer_frame(self, frame: np.ndarray):
+        self.frame_buffer.append(frame)
+        self._frames_since_request += 1
+    
+    def _window_due(self) -> bool:
+        """True once the window is full and stride frames have arrived since the last request"""
+        if not self.frame_buffer.is_full() or self._frames_since_request < self.stride:
+            return False
+        self._frames_since_request = 0
+        return True
+    
+    async def _classify_local_async(self, clip: np.ndarray, position: int, tracks: Detections) -> List[Dict]:
+        """Classify a window's clip with the local model, batched with other windows"""
+        try:
+            label, confidence = await self.local_model.predict_async(clip)
+        except Exception as e:
+            log.warning("Local classifier error: %s", e)
+            return self._classify_heuristic(tracks)
+        return self._local_events(label, confidence, position)
+    
+    @staticmethod
+    def _local_events(label: str, confidence: float, position: int) -> List[Dict]:
+        return [{
+            'event_type': label,
+            'confidence': confidence,
+            'description': '',
+            'timestamp': position
+        }]
+    
+    def _vlm_images(self, frame: np.ndarray) -> Optional[List[np.ndarray]]:
+        """
+        Images to send to the VLM for this frame
+        
+        Returns:
+            The frame itself in 'frame' mode; in clip modes, the buffered
+            clip once the window is full and stride frames have arrived
+            since the last request, otherwise None
+        """
+        if self.clip_mode == 'frame':
+            return [frame]
+        
+        if not self._window_due():
+            return None
+        
+        clip = self.frame_buffer.frames(self.clip_frames)
+        if self.clip_mode == 'grid':
+            return [ClipBuffer.tile(clip)]
+        return list(clip)
+    
+    @staticmethod
+    def _images_hash(images: List[np.ndarray]) -> int:
+        return dhash(images[0] if len(images) == 1 else np.concatenate(images, axis=1))
+    
+    def _build_vlm_messages(self, images: List[np.ndarray]) -> List[Dict]:
+        """Encode the images and build the GPT-4 Vision request messages"""
+        # Encode images to base64
+        images_base64 = [
+            base64.b64encode(cv2.imencode('.jpg', image)[1]).decode('utf-8')
+            for image in images
+        ]
+        
+        if self.clip_mode == 'grid':
+            intro = (f"This image is a grid of {self.clip_frames} consecutive video frames from a football match, "
+                     "in order left-to-right, top-to-bottom. Analyze the sequence.")
+        elif len(images) > 1:
+            intro = (f"These {len(images)} images are consecutive video frames from a football match, "
+                     "in chronological order. Analyze the sequence.")
+        else:
+            intro = "Analyze this video frame from a football match."
+        
+        # Prepare prompt for GPT-4 Vision
+        prompt = f"""You are an expert football analyst. {intro}
             
 Identify what event is happening:
 - pass: Player passing the ball
@@ -81,68 +310,93 @@ Identify what event is happening:
 - save: Goalkeeper making a save
 
 Respond ONLY with a JSON object in this exact format:
-{"event": "event_name", "confidence": 0.0-1.0, "description": "brief description"}
+{{"event": "event_name", "confidence": 0.0-1.0, "description": "brief description"}}
 
 If no clear event is happening, return:
-{"event": "play", "confidence": 0.5, "description": "general play"}"""
+{{"event": "play", "confidence": 0.5, "description": "general play"}}"""
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o",  # Latest GPT-4 with vision
-                messages=[
+        return [
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": prompt}] + [
                     {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{frame_base64}",
-                                    "detail": "low"  # Use low detail for faster processing
-                                }
-                            }
-                        ]
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_base64}",
+                            "detail": "low"  # Use low detail for faster processing
+                        }
                     }
-                ],
-                max_tokens=150,
-                temperature=0.3
-            )
-            
-            # Parse response
-            result_text = response.choices[0].message.content.strip()
+                    for image_base64 in images_base64
+                ]
+            }
+        ]
+    
+    def _parse_vlm_response(self, result_text: str, position: int) -> List[Dict]:
+        """Parse the JSON event returned by GPT-4 Vision"""
+        result_text = result_text.strip()
+        
+        # Remove markdown code blocks if present
+        if "```json" in result_text:
+            result_text = result_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in result_text:
+            result_text = result_text.split("```")[1].split("```")[0].strip()
+        
+        result = json.loads(result_text)
+        
+        return [{
+            'event_type': result.get('event', 'play'),
+            'confidence': float(result.get('confidence', 0.5)),
+            'description': result.get('description', ''),
+            'timestamp': position
+        }]
+    
+    @staticmethod
+    def _restamp(events: List[Dict], position: int) -> List[Dict]:
+        """Copy cached events with this frame's buffer position"""
+        return [{**event, 'timestamp': position} for event in events]
+    
+    def _classify_with_vlm(self, images: List[np.ndarray], tracks: Detections) -> List[Dict]:
+        """Use GPT-4 Vision to classify football events"""
+        try:
+            if self.cache is not None:
+                frame_hash = self._images_hash(images)
+                cached = self.cache.get_local(frame_hash)
+                if cached is not None:
+                    return self._restamp(cached, len(self.frame_buffer))
             
-            # Try to extract JSON
-            import json
-            # Remove markdown code blocks if present
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+            metrics.inc('external_api_requests_total', api='vlm')
+            with metrics.timer('external_api_seconds', api='vlm'):
+                response = self.client.chat.completions.create(
+                    model="gpt-4o",  # Latest GPT-4 with vision
+                    messages=self._build_vlm_messages(images),
+                    max_tokens=150,
+                    temperature=0.3
+                )
             
-            result = json.loads(result_text)
+            # Parse response
+            events = self._parse_vlm_response(response.choices[0].message.content, len(self.frame_buffer))
             
-            return [{
-                'event_type': result.get('event', 'play'),
-                'confidence': float(result.get('confidence', 0.5)),
-                'description': result.get('description', ''),
-                'timestamp': len(self.frame_buffer)
-            }]
+            if self.cache is not None:
+                self.cache.put_local(frame_hash, events)
+            return events
             
         except Exception as e:
-            print(f"GPT-4 Vision error: {e}")
+            metrics.inc('external_api_errors_total', api='vlm')
+            log.warning("GPT-4 Vision error: %s", e)
             # Fallback to heuristics
             return self._classify_heuristic(tracks)
     
-    def _classify_heuristic(self, tracks: List[Dict]) -> List[Dict]:
+    def _classify_heuristic(self, tracks: Detections) -> List[Dict]:
         """Simple heuristic-based event detection (fallback)"""
         events = []
         
         # Count players and ball
-        players = [t for t in tracks if t['class_name'] == 'person']
-        balls = [t for t in tracks if t['class_name'] == 'sports ball']
+        players = tracks.count('person')
+        balls = tracks.count('sports ball')
         
-        if len(players) > 10 and len(balls) > 0:
+        if players > 10 and balls > 0:
             # Detect potential events based on ball position and player proximity
-            if len(self.frame_buffer) == self.window_size:
+            if self.frame_buffer.is_full():
                 events.append({
                     'event_type': 'pass',
                     'confidence': 0.7,
@@ -7,12 +7,25 @@ class Config:
         with open(config_path, 'r') as f:
             self.data = yaml.safe_load(f)
         
+        self.sampling = self.data['pipeline'].get('sampling', {})
+        self.gating = self.data['pipeline'].get('gating', {})
         self.detection = self.data['pipeline']['detection']
         self.tracking = self.data['pipeline']['tracking']
         self.classification = self.data['pipeline']['classification']
         self.aggregation = self.data['pipeline']['aggregation']
         self.commentary = self.data['pipeline']['commentary']
         self.tts = self.data['pipeline']['tts']
+        self.parallel = self.data['pipeline'].get('parallel', {})
+        self.scheduler = self.data['pipeline'].get('scheduler', {})
+        self.metrics = self.data['pipeline'].get('metrics', {})
+        self.logging = self.data['pipeline'].get('logging', {})
+        
+        # Model settings live next to the pipeline config
+        models_path = Path(config_path).with_name('models.yaml')
+        self.models = {}
+        if models_path.exists():
+            with open(models_path, 'r') as f:
+                self.models = (yaml.safe_load(f) or {}).get('models', {})
     
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value by dot-separated key"""
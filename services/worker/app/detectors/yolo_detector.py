@@ -1,22 +1,107 @@
-from ultralytics import YOLO
+import threading
+import time
 import numpy as np
-from typing import List, Dict
+from pathlib import Path
+from typing import List, Dict, Optional
+from app.utils.detections import Detections
+
+# Where Ultralytics writes each export format, relative to the weights
+EXPORT_SUFFIXES = {
+    'torchscript': '.torchscript',
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+    'engine': '.engine'
+}
 
 class YOLODetector:
     """YOLO-based object detector for players and ball"""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, model_config: Optional[Dict] = None):
         self.config = config
-        self.confidence_threshold = config.get('confidence_threshold', 0.5)
+        self.model_config = model_config or {}
+        self.confidence_threshold = config.get('confidence_threshold', 0.1)
+        self.imgsz = self.model_config.get('imgsz', 640)
+        self.batch_size = self.model_config.get('batch_size', 1)
+        self.device = self.model_config.get('device', 'cpu')
         self.model = None
-        self.load_model(config.get('model', 'yolov8n'))
+        self.class_names = {}
+        self._class_ids = None
+        # Ultralytics predictors are not thread-safe; concurrent jobs take turns
+        self._lock = threading.Lock()
+        # Weights from models.yaml; the pipeline's model name is the fallback
+        self.load_model(self.model_config.get('path') or config.get('model', 'yolov8n'))
+        if self.model_config.get('warmup', True):
+            self.warmup()
     
     def load_model(self, model_path: str):
-        """Load YOLO model"""
-        self.model = YOLO(model_path)
-        print(f"Loaded YOLO model: {model_path}")
+        """
+        Load YOLO weights, or the pre-exported copy set by the export option
+        
+        Torch and Ultralytics are imported here rather than with the module,
+        so importing the pipeline stays cheap.
+        """
+        import torch
+        from ultralytics import YOLO
+        
+        if self.device.startswith('cuda') and not torch.cuda.is_available():
+            self.device = 'cpu'
+        export_format = self.model_config.get('export')
+        if export_format:
+            model_path = self._exported(model_path, export_format)
+        
+        self.model = YOLO(model_path, task='detect')
+        self.class_names = self.model.names
+        print(f"Loaded YOLO model: {model_path} ({self.device})")
+    
+    def _exported(self, model_path: str, export_format: str) -> str:
+        """Path of the exported model, exporting the weights on first use"""
+        from ultralytics import YOLO
+        
+        weights = Path(model_path)
+        exported = weights.with_name(weights.stem + EXPORT_SUFFIXES[export_format])
+        if exported.exists():
+            return str(exported)
+        
+        print(f"Exporting {model_path} to {export_format} (first start only)...")
+        try:
+            return YOLO(model_path).export(
+                format=export_format,
+                imgsz=self.imgsz,
+                batch=self.batch_size,
+                # Partial batches at the end of a video need a dynamic batch size
+                dynamic=export_format != 'torchscript',
+                half=export_format == 'engine',
+                device=self.device
+            )
+        except Exception as e:
+            print(f"YOLO export failed, using {model_path}: {e}")
+            return model_path
+    
+    def warmup(self):
+        """
+        Run a dummy batch at the configured size
+        
+        The first inference initializes the predictor, allocates memory and
+        (on GPU) selects kernels; doing it here keeps that cost off the first
+        real frames.
+        """
+        start = time.perf_counter()
+        frames = [np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)] * self.batch_size
+        self.detect_batch(frames)
+        print(f"YOLO warmed up in {time.perf_counter() - start:.2f}s")
+    
+    def _allowed_class_ids(self, device):
+        """Tensor of class IDs to keep, resolved once from the model's names"""
+        import torch
+        
+        if self._class_ids is None or self._class_ids.device != device:
+            # Config may spell COCO names with underscores ('sports_ball')
+            wanted = {c.replace('_', ' ') for c in self.config.get('classes', ['person', 'sports ball'])}
+            ids = [class_id for class_id, name in self.class_names.items() if name in wanted]
+            self._class_ids = torch.tensor(ids, dtype=torch.float32, device=device)
+        return self._class_ids
     
-    def detect(self, frame: np.ndarray) -> List[Dict]:
+    def detect(self, frame: np.ndarray) -> Detections:
         """
         Detect objects in frame using YOLO
         
@@ -24,31 +109,44 @@ class YOLODetector:
             frame: Input image as numpy array (HxWxC)
             
         Returns:
-            List of detections
+            Detections for the frame
+        """
+        return self.detect_batch([frame])[0]
+    
+    def detect_batch(self, frames: List[np.ndarray]) -> List[Detections]:
         """
-        results = self.model(frame, verbose=False)[0]
+        Detect objects in several frames with a single model call
         
-        detections = []
-        for box in results.boxes:
-            confidence = float(box.conf[0])
-            
-            if confidence < self.confidence_threshold:
-                continue
-            
-            class_id = int(box.cls[0])
-            class_name = results.names[class_id]
-            
-            # Filter for relevant classes
-            if class_name not in self.config.get('classes', ['person', 'sports ball']):
-                continue
+        Confidence and class filtering are applied as tensor masks, so only
+        the kept boxes are copied to host memory, once per frame.
+        
+        Args:
+            frames: Input images as numpy arrays (HxWxC)
             
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+        Returns:
+            List of detections for each frame
+        """
+        if not frames:
+            return []
+        
+        import torch
+        
+        with self._lock:
+            # Ultralytics drops boxes under 0.25 by default; low-score boxes feed the tracker
+            results = self.model(frames, imgsz=self.imgsz, conf=self.confidence_threshold,
+                                 device=self.device, verbose=False)
+        
+        batch_detections = []
+        for result in results:
+            boxes = result.boxes
+            keep = boxes.conf >= self.confidence_threshold
+            keep &= torch.isin(boxes.cls, self._allowed_class_ids(boxes.cls.device))
             
-            detections.append({
-                'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                'confidence': confidence,
-                'class_id': class_id,
-                'class_name': class_name
-            })
-        
-        return detections
+            batch_detections.append(Detections(
+                boxes.xyxy[keep].cpu().numpy(),
+                boxes.conf[keep].cpu().numpy(),
+                boxes.cls[keep].cpu().numpy(),
+                class_names=self.class_names
+            ))
+        
+        return batch_detections
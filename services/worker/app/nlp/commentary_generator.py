@@ -1,28 +1,43 @@
-from typing import Dict
+from typing import AsyncIterator, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import logging
 import random
 import os
-from openai import OpenAI
 from pathlib import Path
 from dotenv import load_dotenv
+from app.utils.metrics import metrics
 
 # Load environment variables
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 class CommentaryGenerator:
     """Generate natural language commentary from events using OpenAI"""
     
     def __init__(self, config: Dict):
         self.config = config
         self.templates = self._load_templates()
+        # LRU cache of generated lines keyed by (event_type, description)
+        self.cache_size = config.get('cache_size', 256)
+        self.cache: OrderedDict = OrderedDict()
+        # Bound on concurrent requests made through generate_async
+        self.max_in_flight = config.get('max_in_flight', 4)
+        self._semaphore = None
         
         # Initialize OpenAI client
         api_key = os.getenv('OPENAI_API_KEY')
+        base_url = config.get('base_url') or os.getenv('OPENAI_BASE_URL')
         if api_key:
-            self.client = OpenAI(api_key=api_key)
+            from openai import OpenAI, AsyncOpenAI
+            self.client = OpenAI(api_key=api_key, base_url=base_url)
+            self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
             self.use_openai = True
             print("OpenAI GPT enabled for commentary generation")
         else:
             self.client = None
+            self.async_client = None
             self.use_openai = False
             print("Using template-based commentary (no OpenAI API key found)")
     
@@ -75,54 +90,170 @@ class CommentaryGenerator:
         Returns:
             Commentary text
         """
-        event_type = event.get('event_type', 'pass')
-        event_description = event.get('description', '')
-        
         # Use OpenAI if available
         if self.use_openai and self.client:
             return self._generate_with_openai(event)
         
         # Fallback to templates
-        templates = self.templates.get(event_type, self.templates['pass'])
-        return random.choice(templates)
+        return self.generate_template(event)
     
-    def _generate_with_openai(self, event: Dict) -> str:
-        """Generate commentary using OpenAI GPT"""
+    async def generate_async(self, event: Dict, fallback: bool = False) -> str:
+        """
+        Generate commentary without blocking the event loop
+        
+        Args:
+            event: Event dictionary with type and metadata
+            fallback: Use a template line instead of calling the API (e.g. when backed up)
+            
+        Returns:
+            Commentary text
+        """
+        if not (self.use_openai and self.async_client):
+            return self.generate_template(event)
+        
+        key = self._cache_key(event)
+        commentary = self._cache_get(key)
+        if commentary is not None:
+            return commentary
+        if fallback:
+            metrics.inc('commentary_fallbacks_total')
+            return self.generate_template(event)
+        
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        
         try:
-            event_type = event.get('event_type', 'pass')
-            confidence = event.get('confidence', 0.5)
-            frame_id = event.get('frame_id', 0)
-            description = event.get('description', '')
+            async with self._semaphore:
+                metrics.inc('external_api_requests_total', api='commentary')
+                with metrics.timer('external_api_seconds', api='commentary'):
+                    response = await self.async_client.chat.completions.create(**self._request(event))
+            commentary = response.choices[0].message.content.strip()
+        except Exception as e:
+            metrics.inc('external_api_errors_total', api='commentary')
+            log.warning("OpenAI error: %s", e)
+            return self.generate_template(event)
+        
+        self._cache_put(key, commentary)
+        return commentary
+    
+    async def generate_stream(self, event: Dict, fallback: bool = False) -> AsyncIterator[str]:
+        """
+        Generate commentary as a stream of text deltas
+        
+        Cached and template lines are yielded as a single delta. If the
+        stream fails part-way, the remaining text is not recoverable, so
+        callers should treat the joined deltas as provisional and publish
+        the final line separately.
+        
+        Args:
+            event: Event dictionary with type and metadata
+            fallback: Use a template line instead of calling the API (e.g. when backed up)
             
-            # If we have a description from GPT-4 Vision, use it for context
-            if description:
-                prompt = f"""You are a football commentator. Generate ONE SHORT sentence (max 8 words) for this event:
+        Yields:
+            Text deltas
+        """
+        key = self._cache_key(event)
+        commentary = self._cache_get(key) if self.use_openai else None
+        if commentary is None and (fallback or not (self.use_openai and self.async_client)):
+            if fallback and self.use_openai:
+                metrics.inc('commentary_fallbacks_total')
+            commentary = self.generate_template(event)
+        if commentary is not None:
+            yield commentary
+            return
+        
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        
+        parts = []
+        async with self._semaphore:
+            metrics.inc('external_api_requests_total', api='commentary')
+            # Covers the whole stream, until the last delta has arrived
+            with metrics.timer('external_api_seconds', api='commentary'):
+                try:
+                    stream = await self.async_client.chat.completions.create(**self._request(event), stream=True)
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                except Exception:
+                    metrics.inc('external_api_errors_total', api='commentary')
+                    raise
+        
+        self._cache_put(key, ''.join(parts).strip())
+    
+    def generate_template(self, event: Dict) -> str:
+        """Pick a template line for the event type"""
+        templates = self.templates.get(event.get('event_type', 'pass'), self.templates['pass'])
+        return random.choice(templates)
+    
+    @staticmethod
+    def _cache_key(event: Dict):
+        return event.get('event_type', 'pass'), event.get('description', '')
+    
+    def _cache_get(self, key) -> Optional[str]:
+        commentary = self.cache.get(key)
+        if commentary is not None:
+            self.cache.move_to_end(key)
+        return commentary
+    
+    def _cache_put(self, key, commentary: str):
+        self.cache[key] = commentary
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+    
+    def _request(self, event: Dict) -> Dict:
+        """Build the chat completion request for an event"""
+        event_type = event.get('event_type', 'pass')
+        description = event.get('description', '')
+        
+        # If we have a description from GPT-4 Vision, use it for context
+        if description:
+            prompt = f"""You are a football commentator. Generate ONE SHORT sentence (max 8 words) for this event:
                 
 Event: {event_type}
 What's happening: {description}
 
 Just one brief, exciting sentence!"""
-            else:
-                prompt = f"""You are a football commentator. Generate ONE SHORT sentence (max 8 words) for this event:
+        else:
+            prompt = f"""You are a football commentator. Generate ONE SHORT sentence (max 8 words) for this event:
                 
 Event: {event_type}
 
 Just one brief, exciting sentence!"""
+        
+        return {
+            'model': self.config.get('model', 'gpt-3.5-turbo'),
+            'messages': [
+                {"role": "system", "content": "You are a football commentator. Always respond with ONE SHORT sentence only (max 8 words). Be exciting but brief."},
+                {"role": "user", "content": prompt}
+            ],
+            'max_tokens': 30,
+            'temperature': self.config.get('temperature', 0.7)
+        }
+    
+    def _generate_with_openai(self, event: Dict) -> str:
+        """Generate commentary using OpenAI GPT"""
+        key = self._cache_key(event)
+        commentary = self._cache_get(key)
+        if commentary is not None:
+            return commentary
+        
+        try:
+            metrics.inc('external_api_requests_total', api='commentary')
+            with metrics.timer('external_api_seconds', api='commentary'):
+                response = self.client.chat.completions.create(**self._request(event))
             
-            response = self.client.chat.completions.create(
-                model=self.config.get('model', 'gpt-3.5-turbo'),
-                messages=[
-                    {"role": "system", "content": "You are a football commentator. Always respond with ONE SHORT sentence only (max 8 words). Be exciting but brief."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=30,
-                temperature=self.config.get('temperature', 0.7)
-            )
-            
-            return response.choices[0].message.content.strip()
+            commentary = response.choices[0].message.content.strip()
+            self._cache_put(key, commentary)
+            return commentary
             
         except Exception as e:
-            print(f"OpenAI error: {e}")
+            metrics.inc('external_api_errors_total', api='commentary')
+            log.warning("OpenAI error: %s", e)
             # Fallback to templates
-            templates = self.templates.get(event.get('event_type', 'pass'), self.templates['pass'])
-            return random.choice(templates)
+            return self.generate_template(event)
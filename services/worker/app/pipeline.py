@@ -1,135 +1,624 @@
 import asyncio
+import copy
+import logging
+import time
 import yaml
 import json
 import redis.asyncio as redis
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from app.detectors.yolo_detector import YOLODetector
 from app.trackers.bytetrack_wrapper import ByteTrackWrapper
 from app.classifiers.video_classifier import VideoClassifier
+from app.classifiers.shot_gate import ShotGate
 from app.aggregator.event_aggregator import EventAggregator
 from app.nlp.commentary_generator import CommentaryGenerator
 from app.tts.piper_tts import PiperTTS
 from app.utils.video_reader import VideoReader
+from app.utils.frame_prefetcher import FramePrefetcher
+from app.utils.log import setup_logging
+from app.utils.metrics import metrics
+from app.segments import SegmentRecord, SegmentMerger, create_segment_pool, plan_segments, process_segment_async
+from app.scheduler import JobScheduler
 from app.config import Config
 
 # Load environment variables
 load_dotenv(Path(__file__).parent.parent.parent.parent / '.env')
 
+log = logging.getLogger(__name__)
+
 class CommentaryPipeline:
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, perception_only: bool = False):
+        start = time.perf_counter()
+        self.config_path = config_path
         self.config = Config(config_path)
+        setup_logging(self.config.logging)
         
         # Initialize components
         print("Initializing pipeline components...")
-        self.detector = YOLODetector(self.config.detection)
-        self.tracker = ByteTrackWrapper(self.config.tracking)
-        self.classifier = VideoClassifier(self.config.classification)
-        self.aggregator = EventAggregator(self.config.aggregation)
-        self.commentary_gen = CommentaryGenerator(self.config.commentary)
-        self.tts = PiperTTS(self.config.tts)
-        print("Pipeline ready!")
-    
-    async def process_video(self, video_path: str, job_id: str, redis_client):
-        """Process a video and generate commentary"""
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector-load") as loader:
+            # The detector (torch import, weights, warm-up) is the slowest to
+            # start, so it loads while the other components initialize
+            detector = loader.submit(YOLODetector, self.config.detection, self.config.models.get('yolo'))
+            self.shot_gate = ShotGate(self.config.gating)
+            self.tracker = ByteTrackWrapper(self.config.tracking)
+            self.classifier = VideoClassifier(self.config.classification, self.config.models.get('classifier'))
+            # Segment workers only run perception and classification
+            if not perception_only:
+                self.aggregator = EventAggregator(self.config.aggregation)
+                self.commentary_gen = CommentaryGenerator(self.config.commentary)
+                self.tts = PiperTTS(self.config.tts, self.config.models.get('piper'))
+                # Processes are only spawned once a parallel job submits segments
+                self.segment_pool = create_segment_pool(config_path, self.config.parallel.get('workers', 0))
+            self.detector = detector.result()
+        self.startup_seconds = time.perf_counter() - start
+        print(f"Pipeline ready in {self.startup_seconds:.1f}s!")
+    
+    def for_job(self) -> 'CommentaryPipeline':
+        """
+        Pipeline for one of several concurrent jobs
+        
+        Models, API clients, caches and the segment pool are shared with
+        this pipeline; the per-video state (shot gate, tracker, classifier
+        window and aggregator) is the job's own.
+        """
+        job = copy.copy(self)
+        job.shot_gate = ShotGate(self.config.gating)
+        job.tracker = ByteTrackWrapper(self.config.tracking)
+        job.classifier = self.classifier.fork()
+        job.aggregator = EventAggregator(self.config.aggregation)
+        return job
+    
+    async def process_video(self, video_path: str, job_id: str, redis_client, parallel: bool = False):
+        """
+        Process a video and generate commentary
+        
+        Args:
+            video_path: Path of the uploaded video
+            job_id: Job whose status and commentary channels are updated
+            redis_client: Async Redis client
+            parallel: Split the video into segments processed across a
+                process pool instead of reading it front to back
+        """
         try:
             print(f"Processing video: {video_path}")
             await redis_client.set(f"job:{job_id}:status", "processing")
+            # A retried job starts its stored commentary over
+            await redis_client.delete(f"job:{job_id}:commentary")
+            self.classifier.attach_redis(redis_client)
+            self.aggregator.reset()
             
-            reader = VideoReader(video_path)
-            print(f"Video info: {reader.frame_count} frames, {reader.fps} fps")
+            if parallel:
+                frame_count = await self._process_segments(video_path, job_id, redis_client)
+            else:
+                frame_count = await self._process_sequential(video_path, job_id, redis_client)
             
-            frame_count = 0
-            for frame_id, frame in enumerate(reader):
-                frame_count += 1
-                
-                # Process every 30th frame for efficiency
-                if frame_id % 30 != 0:
-                    continue
-                
-                # Detect objects
-                detections = self.detector.detect(frame)
-                print(f"[Frame {frame_id}] Detected {len(detections)} objects")
-                
-                # Track objects
-                tracks = self.tracker.update(detections, frame)
-                
-                # Classify events
-                events = self.classifier.classify(frame, tracks)
-                
-                # Debug: print events detected
-                if events:
-                    print(f"[Frame {frame_id}] Events: {events}")
-                
-                # Aggregate events
-                aggregated = self.aggregator.process(events, frame_id)
-                
-                if aggregated:
-                    # Generate commentary
-                    commentary = self.commentary_gen.generate(aggregated)
-                    
-                    print(f"[Frame {frame_id}] Commentary: {commentary}")
-                    
-                    # Publish to Redis
-                    commentary_data = {
-                        'frame_id': frame_id,
-                        'commentary': commentary,
-                        'timestamp': frame_id / reader.fps,
-                        'event_type': aggregated['event_type']
-                    }
-                    
-                    await redis_client.publish(
-                        f"commentary:{job_id}",
-                        json.dumps(commentary_data)
-                    )
-                
-                # Small delay
-                await asyncio.sleep(0.01)
-            
-            print(f"Processed {frame_count} total frames")
+            print(f"Processed {frame_count} sampled frames")
             await redis_client.set(f"job:{job_id}:status", "completed")
+            await self._log_and_publish({'type': 'end', 'status': 'completed'}, job_id, redis_client)
             print(f"Job {job_id} completed!")
             
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"Error processing video: {e}")
             import traceback
             traceback.print_exc()
             await redis_client.set(f"job:{job_id}:status", f"error: {str(e)}")
+            await self._log_and_publish({'type': 'end', 'status': f"error: {str(e)}"}, job_id, redis_client)
+    
+    @staticmethod
+    async def _log_and_publish(record: Dict, job_id: str, redis_client):
+        """
+        Append a record to the job's commentary log, then publish it live
+        
+        The log (the Redis stream job:{job_id}:commentary) lets clients that
+        connect late or reconnect replay what they missed; the published
+        copy carries the record's log offset so they can tell where the
+        replay ends and the live channel picks up.
+        """
+        offset = await redis_client.xadd(f"job:{job_id}:commentary", {'data': json.dumps(record)})
+        await redis_client.publish(f"commentary:{job_id}", json.dumps({**record, 'offset': offset}))
+    
+    async def _process_sequential(self, video_path: str, job_id: str, redis_client) -> int:
+        """Read the whole video in this process; returns the number of sampled frames"""
+        self.shot_gate.reset()
+        self.tracker.reset()
+        self.classifier.reset()
+        
+        reader = VideoReader(video_path)
+        print(f"Video info: {reader.frame_count} frames, {reader.fps} fps")
+        
+        prefetcher = self._start_prefetcher(reader)
+        try:
+            tracked = asyncio.Queue(maxsize=self.config.sampling.get('stage_queue_size', 4))
+            classified = asyncio.Queue(maxsize=self.classifier.queue_size)
+            queues = {
+                'decoded': prefetcher.queue,
+                'tracked': tracked,
+                'classifying': classified
+            }
+            stages = [
+                asyncio.create_task(self._perception_stage(prefetcher, tracked)),
+                asyncio.create_task(self._classification_stage(tracked, classified))
+            ]
+            results = await self._run_stages(stages, classified, queues, job_id, redis_client)
+            return results[2]
+        finally:
+            prefetcher.stop()
+    
+    async def _process_segments(self, video_path: str, job_id: str, redis_client) -> int:
+        """
+        Run perception and classification of overlapping segments in the
+        process pool, then aggregate and narrate the merged results here
+        
+        Returns:
+            Number of sampled frames
+        """
+        parallel = self.config.parallel
+        reader = VideoReader(video_path)
+        stride = reader.resolve_stride(
+            self.config.sampling.get('stride', 30),
+            self.config.sampling.get('target_fps')
+        )
+        segments = plan_segments(
+            reader.frame_count, reader.fps, stride,
+            segment_seconds=parallel.get('segment_seconds', 120),
+            overlap_seconds=parallel.get('overlap_seconds', 20)
+        )
+        print(f"Video info: {reader.frame_count} frames, {reader.fps} fps, {len(segments)} segments")
+        del reader
+        
+        futures = [process_segment_async(self.segment_pool, video_path, segment) for segment in segments]
+        try:
+            classified = asyncio.Queue(maxsize=self.config.sampling.get('stage_queue_size', 4))
+            queues = {'classifying': classified}
+            stages = [asyncio.create_task(self._segment_stage(segments, futures, classified))]
+            results = await self._run_stages(stages, classified, queues, job_id, redis_client)
+            return results[1]
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    async def process_segment(self, video_path: str, segment: Dict) -> List[SegmentRecord]:
+        """
+        Detect, track and classify one segment (run inside a segment worker)
+        
+        Args:
+            video_path: Path of the video
+            segment: Segment from plan_segments, including its warm-up overlap
+            
+        Returns:
+            (frame_id, timestamp, events, tracks) for every sampled frame;
+            gated frames have no events and tracks None
+        """
+        self.shot_gate.reset()
+        self.tracker.reset()
+        self.classifier.reset()
+        
+        reader = VideoReader(video_path)
+        prefetcher = self._start_prefetcher(reader, segment['start'], segment['core_end'])
+        try:
+            tracked = asyncio.Queue(maxsize=self.config.sampling.get('stage_queue_size', 4))
+            classified = asyncio.Queue(maxsize=self.classifier.queue_size)
+            stages = [
+                asyncio.create_task(self._perception_stage(prefetcher, tracked)),
+                asyncio.create_task(self._classification_stage(tracked, classified)),
+                asyncio.create_task(self._collect_stage(classified))
+            ]
+            results = await self._gather_stages(stages, classified)
+            live = sum(tracks is not None for _, _, _, tracks in results[2])
+            print(f"Segment {segment['index']}: {live} live frames")
+            return results[2]
+        finally:
+            prefetcher.stop()
+    
+    def _start_prefetcher(self, reader: VideoReader, start: int = 0, end: Optional[int] = None) -> FramePrefetcher:
+        # Only the sampled frames are decoded; skipped frames are grabbed
+        frames = reader.sample(
+            stride=self.config.sampling.get('stride', 30),
+            target_fps=self.config.sampling.get('target_fps'),
+            seek_threshold=self.config.sampling.get('seek_threshold', 0),
+            start=start,
+            end=end
+        )
+        # Timed on the prefetch thread, one observation per sampled frame
+        frames = metrics.timed_iter(frames, 'stage_seconds', stage='decode')
+        
+        # Decode on a background thread while the stages run inference
+        prefetcher = FramePrefetcher(
+            frames,
+            maxsize=self.config.sampling.get('prefetch_size', 8),
+            resize_width=self.config.sampling.get('resize_width')
+        )
+        prefetcher.start()
+        return prefetcher
+    
+    async def _run_stages(self, stages: List[asyncio.Task], classified: asyncio.Queue,
+                          queues: Dict[str, asyncio.Queue], job_id: str, redis_client) -> List:
+        """
+        Add the event, commentary, publish and speech stages behind the
+        classified queue and run everything to completion
+        
+        Returns:
+            Stage results; the event stage's frame count follows the input stages
+        """
+        aggregated = asyncio.Queue(maxsize=self.config.commentary.get('queue_size', 16))
+        generating = asyncio.Queue(maxsize=self.commentary_gen.max_in_flight)
+        queues['aggregated'] = aggregated
+        queues['generating'] = generating
+        
+        # Speech is synthesized server-side only when a real TTS backend is available
+        speech = None
+        if self.config.tts.get('enabled', True) and self.tts.available:
+            speech = asyncio.Queue(maxsize=self.config.tts.get('queue_size', 16))
+            queues['speech'] = speech
+        
+        stages = stages + [
+            asyncio.create_task(self._event_stage(classified, aggregated, queues, job_id, redis_client)),
+            asyncio.create_task(self._commentary_stage(aggregated, generating, job_id, redis_client)),
+            asyncio.create_task(self._publish_stage(generating, speech, job_id, redis_client))
+        ]
+        if speech is not None:
+            stages.append(asyncio.create_task(self._speech_stage(speech, job_id, redis_client)))
+        return await self._gather_stages(stages, classified)
+    
+    @staticmethod
+    async def _gather_stages(stages: List[asyncio.Task], classified: asyncio.Queue) -> List:
+        """
+        Run stages to completion
+        
+        Stages only send their end-of-stream marker when they finish
+        normally. If one fails, or the job is cancelled, every stage is
+        cancelled and awaited, so none is left blocked on a full queue
+        holding on to its frames, and classifications still waiting in
+        the classified queue are cancelled rather than left to finish.
+        """
+        try:
+            return await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            while not classified.empty():
+                item = classified.get_nowait()
+                if item is not None and item[3] is not None:
+                    item[3].cancel()
+    
+    async def _segment_stage(self, segments: List[Dict], futures: List[asyncio.Future],
+                             classified: asyncio.Queue):
+        """Feed merged segment results to the event stage in video order"""
+        merger = SegmentMerger(self.config.parallel.get('track_match_iou', 0.5))
+        loop = asyncio.get_running_loop()
+        for segment, future in zip(segments, futures):
+            records, snapshot = await future
+            metrics.merge(snapshot)
+            for frame_id, timestamp, events, tracks in merger.merge(segment, records):
+                # Already classified; the event stage awaits a finished future
+                result = loop.create_future()
+                result.set_result(events)
+                await classified.put((frame_id, timestamp, tracks, result))
+            print(f"Segment {segment['index'] + 1}/{len(segments)} merged")
+        await classified.put(None)
+    
+    async def _collect_stage(self, classified: asyncio.Queue) -> List[SegmentRecord]:
+        """Gather classified frames of a segment in frame order"""
+        records = []
+        while True:
+            item = await classified.get()
+            if item is None:
+                break
+            frame_id, timestamp, tracks, task = item
+            records.append((frame_id, timestamp, await task if task is not None else [], tracks))
+        return records
+    
+    async def _perception_stage(self, prefetcher: FramePrefetcher, tracked: asyncio.Queue):
+        """Gate, detect and track objects on decoded frames, batching detection"""
+        live_index = 0
+        while True:
+            batch = await prefetcher.next_batch(self.detector.batch_size)
+            if not batch:
+                break
+            results = await asyncio.to_thread(self._detect_and_track, batch, live_index)
+            metrics.inc('frames_total', len(batch))
+            for (frame_id, timestamp, frame), (shot, detections, tracks) in zip(batch, results):
+                if not shot['live']:
+                    # Close-ups, crowd shots, graphics and replays skip the heavy stages;
+                    # only their timestamp goes on, for the event aggregator
+                    metrics.inc('frames_dropped_total', reason='gated')
+                    await tracked.put((frame_id, timestamp, None, None))
+                    continue
+                live_index += 1
+                if detections is not None:
+                    log.debug("[Frame %d] Detected %d objects", frame_id, len(detections))
+                await tracked.put((frame_id, timestamp, frame, tracks))
+        # End-of-stream marker
+        await tracked.put(None)
+    
+    def _detect_and_track(self, batch, live_index: int):
+        """
+        Gate frames by shot type, then run detection on every
+        detect_every-th live frame and propagate tracks with the motion
+        model on the live frames in between
+        
+        Returns:
+            List of (shot, detections or None, tracks or None) per frame
+        """
+        detect_every = max(1, self.config.detection.get('detect_every', 1))
+        
+        # Gating is sequential: scene-cut detection compares consecutive frames
+        with metrics.stage('gate'):
+            shots = [self.shot_gate.classify(frame, timestamp) for _, timestamp, frame in batch]
+        
+        detect = []
+        for shot in shots:
+            detect.append(shot['live'] and live_index % detect_every == 0)
+            live_index += shot['live']
+        
+        frames = [frame for _, _, frame in batch]
+        if any(detect):
+            # One observation per detector call, which covers a whole batch
+            with metrics.stage('detect'):
+                batch_detections = self.detector.detect_batch(
+                    [frame for frame, keep in zip(frames, detect) if keep]
+                )
+            metrics.inc('frames_detected_total', sum(detect))
+        else:
+            batch_detections = []
+        batch_detections = iter(batch_detections)
+        
+        # Tracking is sequential, one frame at a time
+        results = []
+        for frame, shot, keep in zip(frames, shots, detect):
+            if shot['scene_cut']:
+                self.tracker.clear_tracks()
+            if not shot['live']:
+                results.append((shot, None, None))
+            elif keep:
+                detections = next(batch_detections)
+                with metrics.stage('track'):
+                    tracks = self.tracker.update(detections, frame)
+                results.append((shot, detections, tracks))
+            else:
+                with metrics.stage('track'):
+                    tracks = self.tracker.propagate(frame)
+                results.append((shot, None, tracks))
+        return results
+    
+    async def _classification_stage(self, tracked: asyncio.Queue, classified: asyncio.Queue):
+        """
+        Start classification of tracked frames concurrently
+        
+        Pending classifications are queued in frame order, so the bounded
+        queue both limits requests in flight and restores frame_id order.
+        """
+        while True:
+            item = await tracked.get()
+            if item is None:
+                break
+            frame_id, timestamp, frame, tracks = item
+            if frame is None:
+                # Gated frame, passed on unclassified
+                await classified.put((frame_id, timestamp, None, None))
+                continue
+            task = asyncio.create_task(metrics.timed(
+                self.classifier.classify_async(frame, tracks), 'stage_seconds', stage='classify'
+            ))
+            try:
+                await classified.put((frame_id, timestamp, tracks, task))
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+        await classified.put(None)
+    
+    async def _event_stage(self, classified: asyncio.Queue, aggregated: asyncio.Queue,
+                           queues: Dict[str, asyncio.Queue], job_id: str, redis_client) -> int:
+        """Aggregate classified frames, in frame order, into commentary-worthy events"""
+        frame_count = 0
+        while True:
+            item = await classified.get()
+            if item is None:
+                break
+            frame_id, timestamp, tracks, task = item
+            # Gated frames (tracks None) have no events but still move video
+            # time on, so candidates are released during close-ups and replays
+            if tracks is not None:
+                frame_count += 1
+            
+            # Wait for this frame's classification
+            events = await task if task is not None else []
+            
+            if events:
+                log.debug("[Frame %d] Events: %s", frame_id, events)
+            
+            # Aggregate events (in video time)
+            with metrics.stage('aggregate'):
+                released = self.aggregator.process(events, frame_id, timestamp)
+            for event in released:
+                # Released at this time; the publish stage measures the latency from here
+                await aggregated.put((event, time.perf_counter()))
+            
+            # Expose queue depths so the slowest stage is visible
+            await redis_client.hset(f"job:{job_id}:queues", mapping=self.queue_depths(queues))
+        
+        # Events still inside their fusion window at the end of the video
+        for event in self.aggregator.flush():
+            await aggregated.put((event, time.perf_counter()))
+        await aggregated.put(None)
+        
+        return frame_count
+    
+    async def _commentary_stage(self, aggregated: asyncio.Queue, generating: asyncio.Queue,
+                                job_id: str, redis_client):
+        """
+        Start commentary generation for aggregated events concurrently
+        
+        When events back up beyond backlog_threshold, template lines are
+        used instead of the LLM so commentary latency stays bounded.
+        """
+        backlog_threshold = self.config.commentary.get('backlog_threshold', 4)
+        stream = self.config.commentary.get('stream', False)
+        line_id = 0
+        while True:
+            item = await aggregated.get()
+            if item is None:
+                break
+            event, released = item
+            backed_up = aggregated.qsize() + generating.qsize() >= backlog_threshold
+            if stream:
+                generation = self._stream_commentary(event, line_id, backed_up, job_id, redis_client)
+            else:
+                generation = self.commentary_gen.generate_async(event, fallback=backed_up)
+            generation = metrics.timed(generation, 'stage_seconds', stage='generate')
+            await generating.put((event, line_id, asyncio.create_task(generation), released))
+            line_id += 1
+        await generating.put(None)
+    
+    async def _stream_commentary(self, event: Dict, line_id: int, fallback: bool,
+                                 job_id: str, redis_client) -> str:
+        """
+        Publish commentary deltas as they are generated
+        
+        Deltas of concurrent lines may interleave; clients group them by
+        line_id and order them by seq. The publish stage then sends the
+        'complete' message with the final text in event order.
+        
+        Returns:
+            Full commentary text
+        """
+        parts = []
+        try:
+            async for delta in self.commentary_gen.generate_stream(event, fallback=fallback):
+                await redis_client.publish(f"commentary:{job_id}", json.dumps({
+                    'type': 'delta',
+                    'line_id': line_id,
+                    'seq': len(parts),
+                    'text': delta,
+                    'frame_id': event['frame_id'],
+                    'timestamp': event['timestamp'],
+                    'event_type': event['event_type']
+                }))
+                parts.append(delta)
+        except Exception as e:
+            log.warning("OpenAI error: %s", e)
+            return self.commentary_gen.generate_template(event)
+        return ''.join(parts).strip()
+    
+    async def _publish_stage(self, generating: asyncio.Queue, speech: Optional[asyncio.Queue],
+                             job_id: str, redis_client):
+        """Publish generated commentary in event order"""
+        while True:
+            item = await generating.get()
+            if item is None:
+                break
+            event, line_id, task, released = item
+            commentary = await task
+            
+            frame_id = event['frame_id']
+            # Every line of commentary is part of the job's output
+            log.info("[Frame %d] Commentary: %s", frame_id, commentary, extra={'rate_limit': False})
+            
+            # Publish to Redis
+            commentary_data = {
+                'type': 'complete',
+                'line_id': line_id,
+                'frame_id': frame_id,
+                'commentary': commentary,
+                'timestamp': event['timestamp'],
+                'event_type': event['event_type'],
+                'audio': speech is not None
+            }
+            
+            with metrics.stage('publish'):
+                await self._log_and_publish(commentary_data, job_id, redis_client)
+            metrics.observe('event_to_publish_seconds', time.perf_counter() - released)
+            
+            if speech is not None:
+                await speech.put((line_id, commentary))
+        if speech is not None:
+            await speech.put(None)
+    
+    async def _speech_stage(self, speech: asyncio.Queue, job_id: str, redis_client):
+        """
+        Synthesize commentary lines and publish them as binary audio messages
+        
+        Lines that queued up while the previous batch was being synthesized
+        are synthesized together; audio is published as each chunk is ready,
+        so a line may arrive as several chunks. Messages on audio:{job_id}
+        are a 4-byte big-endian line_id followed by the encoded audio (MP3
+        or WAV).
+        """
+        loop = asyncio.get_running_loop()
+        batch_size = self.config.tts.get('batch_size', 4)
+        done = False
+        while not done:
+            item = await speech.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < batch_size and not speech.empty():
+                item = speech.get_nowait()
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            
+            # Synthesis runs on a worker thread and hands chunks back as they are produced
+            chunks = asyncio.Queue()
+            def produce(texts: List[str]):
+                try:
+                    for chunk in self.tts.synthesize_stream(texts):
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                finally:
+                    loop.call_soon_threadsafe(chunks.put_nowait, None)
+            producer = asyncio.create_task(metrics.timed(
+                asyncio.to_thread(produce, [text for _, text in batch]), 'stage_seconds', stage='speech'
+            ))
+            try:
+                while (chunk := await chunks.get()) is not None:
+                    index, audio = chunk
+                    line_id = batch[index][0]
+                    await redis_client.publish(f"audio:{job_id}", line_id.to_bytes(4, 'big') + audio)
+                await producer
+            finally:
+                producer.cancel()
+    
+    @staticmethod
+    def queue_depths(queues: Dict[str, asyncio.Queue]) -> Dict[str, int]:
+        """
+        Current depth of each inter-stage queue
+        
+        A queue that stays full points at its consumer as the bottleneck:
+        'decoded' at detection/tracking, 'tracked' at classification
+        dispatch, 'classifying' at the classifier requests and commentary.
+        """
+        return {name: queue.qsize() for name, queue in queues.items()}
 
 async def worker_main():
-    """Main worker loop that listens for jobs from Redis"""
+    """Main worker loop that runs jobs from the Redis job stream"""
     print("Starting worker service...")
     
     # Initialize Redis connection
-    redis_client = await redis.from_url("redis://localhost:6379", decode_responses=True)
+    redis_client = await redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
     print("Connected to Redis")
     
     # Initialize pipeline
     pipeline = CommentaryPipeline("../../configs/pipeline.yaml")
+    scheduler = JobScheduler(pipeline, redis_client, pipeline.config.scheduler)
     
-    print("Worker ready! Waiting for jobs...")
+    # Counters and histograms are summed across workers in Redis and served by the API
+    flusher = asyncio.create_task(
+        metrics.run_flusher(redis_client, pipeline.config.metrics.get('flush_interval', 5.0))
+    )
     
-    while True:
-        try:
-            # Block and wait for job from queue
-            job_data = await redis_client.brpop("video_queue", timeout=1)
-            
-            if job_data:
-                queue_name, job_json = job_data
-                job = json.loads(job_json)
-                
-                job_id = job["job_id"]
-                video_path = job["video_path"]
-                
-                print(f"\nReceived job {job_id}: {job['filename']}")
-                
-                # Process the video
-                await pipeline.process_video(video_path, job_id, redis_client)
-                
-        except Exception as e:
-            print(f"Worker error: {e}")
-            await asyncio.sleep(1)
+    print(f"Worker {scheduler.consumer} ready! Running up to {scheduler.max_jobs} jobs at once...")
+    try:
+        await scheduler.run()
+    finally:
+        flusher.cancel()
 
 if __name__ == "__main__":
     asyncio.run(worker_main())
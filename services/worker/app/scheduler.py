@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import redis.asyncio as redis
+
+class JobScheduler:
+    """
+    Runs uploads from a Redis Streams consumer group, several at a time
+    
+    Every worker process joins the group as its own consumer, so jobs are
+    spread across processes and nodes. An entry is acknowledged only after
+    process_video returns. While a job runs, its owner re-claims the entry
+    every heartbeat_interval seconds, which keeps its idle time low.
+    Entries idle for longer than stall_timeout belonged to a worker that
+    died, and the first worker with a free slot takes them over.
+    """
+    
+    def __init__(self, pipeline, redis_client, config: Dict, consumer: Optional[str] = None):
+        self.pipeline = pipeline
+        self.redis = redis_client
+        self.stream = config.get('stream', 'video_jobs')
+        self.group = config.get('group', 'workers')
+        # hostname-pid alone repeats when a container restarts with the same pid
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.max_jobs = config.get('max_jobs', 2)
+        self.block_ms = int(config.get('block_seconds', 1.0) * 1000)
+        self.heartbeat_interval = config.get('heartbeat_interval', 10.0)
+        self.stall_timeout = config.get('stall_timeout', 60.0)
+        self.max_deliveries = config.get('max_deliveries', 3)
+        # How long a finished job's commentary stays available for reuse
+        self.result_ttl = config.get('result_ttl', 7 * 24 * 3600)
+        
+        # Running jobs by stream entry ID
+        self.jobs: Dict[str, asyncio.Task] = {}
+        self._last_reclaim = 0.0
+        # Present while this worker is up and taking jobs; expires if it dies
+        self.ready_key = f"worker:{self.consumer}:ready"
+    
+    async def setup(self):
+        """Create the stream and consumer group if they do not exist yet"""
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+    
+    async def announce(self):
+        """Set or refresh this worker's readiness key"""
+        await self.redis.set(self.ready_key, json.dumps({
+            'consumer': self.consumer,
+            'max_jobs': self.max_jobs,
+            'running': len(self.jobs),
+            'startup_seconds': round(getattr(self.pipeline, 'startup_seconds', 0.0), 2)
+        }), ex=max(1, int(self.stall_timeout)))
+    
+    async def run(self):
+        """Schedule jobs until cancelled"""
+        await self.setup()
+        await self.announce()
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while True:
+                try:
+                    await self.poll()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Scheduler error: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            heartbeat.cancel()
+            # Unacknowledged jobs are picked up again by another worker
+            for task in self.jobs.values():
+                task.cancel()
+            try:
+                await self.redis.delete(self.ready_key)
+            except Exception:
+                pass
+    
+    async def poll(self):
+        """Fill free job slots with stalled jobs first, then new ones"""
+        free = self.max_jobs - len(self.jobs)
+        if free <= 0:
+            await asyncio.wait(list(self.jobs.values()), timeout=self.block_ms / 1000,
+                               return_when=asyncio.FIRST_COMPLETED)
+            return
+        
+        now = time.monotonic()
+        if now - self._last_reclaim >= self.heartbeat_interval:
+            self._last_reclaim = now
+            for entry_id, fields in await self._reclaim(free):
+                self._start(entry_id, fields)
+            free = self.max_jobs - len(self.jobs)
+            if free <= 0:
+                return
+        
+        response = await self.redis.xreadgroup(
+            self.group, self.consumer, {self.stream: '>'}, count=free, block=self.block_ms
+        )
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                self._start(entry_id, fields)
+    
+    async def _reclaim(self, count: int) -> List[Tuple[str, Dict]]:
+        """Take over entries whose owner stopped sending heartbeats"""
+        _, claimed, *_ = await self.redis.xautoclaim(
+            self.stream, self.group, self.consumer,
+            min_idle_time=int(self.stall_timeout * 1000), start_id='0-0', count=count
+        )
+        
+        entries = []
+        for entry_id, fields in claimed:
+            pending = await self.redis.xpending_range(
+                self.stream, self.group, min=entry_id, max=entry_id, count=1
+            )
+            deliveries = pending[0]['times_delivered'] if pending else 1
+            if not fields or deliveries > self.max_deliveries:
+                # Deleted entry, or a job that keeps killing its workers
+                await self._fail(entry_id, fields, f"error: abandoned after {deliveries - 1} worker failures")
+                continue
+            print(f"Reclaimed stalled job {entry_id} (delivery {deliveries})")
+            entries.append((entry_id, fields))
+        return entries
+    
+    def _start(self, entry_id: str, fields: Dict):
+        self.jobs[entry_id] = asyncio.create_task(self._run_job(entry_id, fields))
+    
+    async def _run_job(self, entry_id: str, fields: Dict):
+        try:
+            await self._process(entry_id, fields)
+        finally:
+            # Off the books before acknowledging, so a heartbeat never takes it for a lost job
+            self.jobs.pop(entry_id, None)
+        # Not reached when cancelled: the job stays pending for another worker
+        await self._ack(entry_id)
+    
+    async def _process(self, entry_id: str, fields: Dict):
+        try:
+            job = json.loads(fields['job'])
+            job_id = job["job_id"]
+            # Whole-match uploads can be split across cores instead of read live
+            parallel = job.get("parallel", self.pipeline.config.parallel.get("enabled", False))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Invalid job {entry_id}: {e}")
+            return
+        
+        print(f"\nReceived job {job_id}: {job['filename']}")
+        await self.redis.set(f"job:{job_id}:worker", self.consumer)
+        
+        # Models are shared; per-video state belongs to this job
+        await self.pipeline.for_job().process_video(job["video_path"], job_id, self.redis, parallel=parallel)
+        await self._store_result(job)
+    
+    async def _store_result(self, job: Dict):
+        """Make a completed job's commentary reusable by uploads of the same video and settings"""
+        job_id = job["job_id"]
+        if await self.redis.get(f"job:{job_id}:status") != "completed":
+            return
+        await self.redis.expire(f"job:{job_id}:commentary", self.result_ttl)
+        await self.redis.expire(f"job:{job_id}:status", self.result_ttl)
+        if job.get("content_key"):
+            await self.redis.set(f"result:{job['content_key']}", job_id, ex=self.result_ttl)
+    
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            # A failed readiness update must not cost the running jobs their heartbeat
+            try:
+                await self.announce()
+            except Exception as e:
+                print(f"Readiness update error: {e}")
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                print(f"Heartbeat error: {e}")
+    
+    async def heartbeat(self):
+        """Reset the idle time of our running jobs; stop jobs another worker took over"""
+        if not self.jobs:
+            return
+        
+        owned = await self.redis.xpending_range(
+            self.stream, self.group, min='-', max='+', count=self.max_jobs * 2,
+            consumername=self.consumer
+        )
+        owned = {entry['message_id'] for entry in owned}
+        for entry_id, task in list(self.jobs.items()):
+            if entry_id not in owned:
+                print(f"Job {entry_id} was reclaimed by another worker; stopping it here")
+                task.cancel()
+        
+        alive = [entry_id for entry_id in self.jobs if entry_id in owned]
+        if alive:
+            # JUSTID leaves the delivery count alone
+            await self.redis.xclaim(self.stream, self.group, self.consumer, 0, alive, justid=True)
+    
+    async def _ack(self, entry_id: str):
+        await self.redis.xack(self.stream, self.group, entry_id)
+        await self.redis.xdel(self.stream, entry_id)
+    
+    async def _fail(self, entry_id: str, fields: Optional[Dict], status: str):
+        if fields:
+            try:
+                job_id = json.loads(fields['job'])['job_id']
+                await self.redis.set(f"job:{job_id}:status", status)
+            except (KeyError, ValueError):
+                pass
+        await self._ack(entry_id)
@@ -0,0 +1,166 @@
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from app.trackers.bytetrack_wrapper import iou_matrix
+from app.utils.detections import Detections
+from app.utils.metrics import metrics
+
+# (frame_id, timestamp, events, tracks) for one sampled frame of a segment
+SegmentRecord = Tuple[int, float, List[Dict], Optional[Detections]]
+
+def plan_segments(frame_count: int, fps: float, stride: int,
+                  segment_seconds: float, overlap_seconds: float) -> List[Dict]:
+    """
+    Split a video into time segments for parallel processing
+    
+    Each segment owns the frames [core_start, core_end) and starts reading
+    at start, overlap_seconds earlier, so its tracker and classifier window
+    are warmed up by the time its own frames begin. Boundaries are
+    multiples of the stride, so the sampled frames match a sequential run.
+    
+    Args:
+        frame_count: Number of frames in the video
+        fps: Frame rate of the video
+        stride: Sampling stride in frames
+        segment_seconds: Length of each segment's own frames
+        overlap_seconds: Warm-up read before each segment
+        
+    Returns:
+        List of {'index', 'start', 'core_start', 'core_end'} dicts
+    """
+    fps = fps if fps > 0 else 30.0
+    length = max(1, round(segment_seconds * fps / stride)) * stride
+    overlap = math.ceil(overlap_seconds * fps / stride) * stride
+    
+    segments = []
+    for index, core_start in enumerate(range(0, max(frame_count, 1), length)):
+        segments.append({
+            'index': index,
+            'start': max(0, core_start - overlap),
+            'core_start': core_start,
+            'core_end': min(frame_count, core_start + length) if frame_count else None
+        })
+    return segments
+
+class SegmentMerger:
+    """
+    Stitch per-segment results back into one stream of frames
+    
+    Frames in a segment's warm-up overlap were already produced by the
+    previous segment and are dropped, so every frame (and its events)
+    appears once. Track IDs are made unique across the match: tracks of a
+    segment that overlap a track of the previous segment on their last
+    common frame inherit its ID, the rest get new IDs.
+    """
+    
+    def __init__(self, match_thresh: float = 0.5):
+        self.match_thresh = match_thresh
+        self.next_id = 0
+        self.previous: Dict[int, Detections] = {}
+    
+    def merge(self, segment: Dict, records: List[SegmentRecord]) -> List[SegmentRecord]:
+        """
+        Args:
+            segment: Segment from plan_segments
+            records: Everything the segment produced, including its overlap
+            
+        Returns:
+            The segment's own records, with match-wide track IDs
+        """
+        id_map = self._boundary_ids(segment, records)
+        
+        merged = []
+        previous = {}
+        for frame_id, timestamp, events, tracks in records:
+            if frame_id < segment['core_start']:
+                continue
+            if tracks is not None:
+                tracks = tracks[:]
+                tracks.track_ids = np.array([self._global_id(id_map, track_id) for track_id in tracks.track_ids],
+                                            dtype=np.int64)
+                previous[frame_id] = tracks
+            merged.append((frame_id, timestamp, events, tracks))
+        
+        self.previous = previous
+        return merged
+    
+    def _boundary_ids(self, segment: Dict, records: List[SegmentRecord]) -> Dict[int, int]:
+        """Map this segment's track IDs to the previous segment's on their last common frame"""
+        common = [
+            (frame_id, tracks) for frame_id, _, _, tracks in records
+            if frame_id < segment['core_start'] and tracks is not None and frame_id in self.previous
+        ]
+        if not common:
+            return {}
+        
+        frame_id, tracks = common[-1]
+        previous = self.previous[frame_id]
+        iou = iou_matrix(tracks.bboxes, previous.bboxes)
+        # Only pair objects of the same class
+        iou[tracks.class_ids[:, None] != previous.class_ids[None, :]] = 0
+        if iou.size == 0:
+            return {}
+        
+        rows, cols = linear_sum_assignment(-iou)
+        return {
+            int(tracks.track_ids[r]): int(previous.track_ids[c])
+            for r, c in zip(rows, cols)
+            if iou[r, c] >= self.match_thresh
+        }
+    
+    def _global_id(self, id_map: Dict[int, int], track_id: int) -> int:
+        if track_id < 0:
+            return track_id
+        if track_id not in id_map:
+            id_map[track_id] = self.next_id
+            self.next_id += 1
+        return id_map[track_id]
+
+# Per-process state of the segment pool
+_pipeline = None
+_loop = None
+
+def _init_worker(config_path: str):
+    """Load the perception models once per worker process"""
+    global _pipeline, _loop
+    from app.pipeline import CommentaryPipeline
+    _pipeline = CommentaryPipeline(config_path, perception_only=True)
+    # One loop for the life of the process; async components bind to it
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+
+def _process_segment(video_path: str, segment: Dict) -> Tuple[List[SegmentRecord], Dict]:
+    records = _loop.run_until_complete(_pipeline.process_segment(video_path, segment))
+    # The parent folds the worker's metrics into its own and flushes them
+    return records, metrics.drain()
+
+def create_segment_pool(config_path: str, workers: int = 0) -> ProcessPoolExecutor:
+    """
+    Start a pool of processes that each hold their own detector and tracker
+    
+    Args:
+        config_path: Pipeline config each process loads
+        workers: Number of processes (0 for one per CPU core)
+    """
+    # Spawned, not forked: CUDA and ONNX Runtime do not survive a fork
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(config_path,)
+    )
+
+def process_segment_async(pool: ProcessPoolExecutor, video_path: str, segment: Dict) -> asyncio.Future:
+    """
+    Process a segment in the pool without blocking the event loop
+    
+    Returns:
+        Future of the segment's records and the metrics the worker recorded
+        for it, to be merged with Metrics.merge
+    """
+    return asyncio.get_running_loop().run_in_executor(pool, _process_segment, video_path, segment)
@@ -1,95 +1,276 @@
+import cv2
 import numpy as np
-from typing import List, Dict
+from scipy.optimize import linear_sum_assignment
+from typing import List, Dict, Tuple
+from app.utils.detections import Detections
+from app.trackers.kalman_filter import KalmanFilter, xyxy_to_xyah, xyah_to_xyxy
+
+def iou_matrix(bboxes1: np.ndarray, bboxes2: np.ndarray) -> np.ndarray:
+    """
+    Compute pairwise intersection over union
+    
+    Args:
+        bboxes1: Nx4 array of (x1, y1, x2, y2) boxes
+        bboxes2: Mx4 array of (x1, y1, x2, y2) boxes
+        
+    Returns:
+        NxM IoU matrix
+    """
+    if len(bboxes1) == 0 or len(bboxes2) == 0:
+        return np.zeros((len(bboxes1), len(bboxes2)), dtype=np.float32)
+    
+    a = bboxes1[:, None, :]
+    b = bboxes2[None, :, :]
+    
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    
+    area1 = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
+    area2 = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
+    union = area1[:, None] + area2[None, :] - intersection
+    
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
 
 class ByteTrackWrapper:
     """Wrapper for ByteTrack multi-object tracker"""
     
     def __init__(self, config: Dict):
         self.config = config
-        self.tracks = {}
-        self.next_id = 0
         self.track_buffer = config.get('track_buffer', 30)
+        # Detections at or above track_thresh are matched first and may start tracks
+        self.track_thresh = config.get('track_thresh', 0.5)
+        # Maximum assignment cost (1 - IoU) for high- and low-score matches
         self.match_thresh = config.get('match_thresh', 0.8)
+        self.low_match_thresh = config.get('low_match_thresh', 0.5)
+        # Refine propagated tracks with sparse Lucas-Kanade optical flow
+        self.use_optical_flow = config.get('optical_flow', False)
+        
+        self.kalman = KalmanFilter()
+        self.reset()
+    
+    def reset(self):
+        """Start over for a new video, including track ID numbering"""
+        self.class_names = {}
+        self.next_id = 0
+        self.clear_tracks()
     
-    def update(self, detections: List[Dict], frame: np.ndarray) -> List[Dict]:
+    def clear_tracks(self):
+        """
+        Drop all live tracks and their motion state, e.g. on a scene cut
+        
+        Track IDs keep counting up, so objects seen after the cut never
+        reuse the ID of an object from before it.
+        """
+        self.prev_gray = None
+        
+        # Live tracks, stored column-wise
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.track_means = np.empty((0, 8))
+        self.track_covariances = np.empty((0, 8, 8))
+        self.track_confidences = np.empty(0, dtype=np.float32)
+        self.track_class_ids = np.empty(0, dtype=np.int32)
+        self.track_ages = np.empty(0, dtype=np.int64)
+        self.track_active = np.empty(0, dtype=bool)
+    
+    @property
+    def track_bboxes(self) -> np.ndarray:
+        """Current (x1, y1, x2, y2) box of every live track"""
+        return xyah_to_xyxy(self.track_means[:, :4])
+    
+    def update(self, detections: Detections, frame: np.ndarray) -> Detections:
         """
         Update tracks with new detections
         
+        Follows ByteTrack's two-stage association: high-score detections
+        are assigned to all live tracks first, then low-score detections
+        to the tracks left over. Only high-score detections start new tracks.
+        Tracks are matched at their Kalman-predicted positions.
+        
         Args:
-            detections: List of detections from detector
+            detections: Detections from detector
             frame: Current frame
             
         Returns:
-            List of tracked objects with track IDs
+            Tracked objects, with track IDs filled in
         """
-        tracks = []
+        self.class_names = detections.class_names
+        track_ids = np.full(len(detections), -1, dtype=np.int64)
+        self._predict()
+        track_bboxes = self.track_bboxes
         
-        for detection in detections:
-            bbox = detection['bbox']
-            
-            # Simple IOU-based matching (simplified ByteTrack)
-            matched_id = self._match_detection(bbox)
-            
-            if matched_id is None:
-                matched_id = self.next_id
-                self.next_id += 1
-            
-            track = {
-                'track_id': matched_id,
-                'bbox': bbox,
-                'confidence': detection['confidence'],
-                'class_name': detection['class_name']
-            }
-            
-            self.tracks[matched_id] = {
-                'bbox': bbox,
-                'age': 0
-            }
-            
-            tracks.append(track)
+        high = np.flatnonzero(detections.confidences >= self.track_thresh)
+        low = np.flatnonzero(detections.confidences < self.track_thresh)
+        
+        # First association: high-score detections against every track
+        tracks = np.arange(len(self.track_ids))
+        cost = 1.0 - iou_matrix(track_bboxes, detections.bboxes[high])
+        matches, unmatched_tracks, unmatched_high = self._assign(cost, self.match_thresh)
+        matched_tracks = [tracks[matches[:, 0]]]
+        matched_dets = [high[matches[:, 1]]]
+        
+        # Second association: low-score detections against the remaining tracks
+        remaining = tracks[unmatched_tracks]
+        cost = 1.0 - iou_matrix(track_bboxes[remaining], detections.bboxes[low])
+        matches, _, _ = self._assign(cost, self.low_match_thresh)
+        matched_tracks.append(remaining[matches[:, 0]])
+        matched_dets.append(low[matches[:, 1]])
+        
+        self._apply_matches(np.concatenate(matched_tracks), np.concatenate(matched_dets),
+                            detections, track_ids)
+        
+        # Unmatched high-score detections start new tracks
+        self._start_tracks(high[unmatched_high], detections, track_ids)
         
         # Age out old tracks
         self._age_tracks()
+        self._remember_frame(frame)
         
-        return tracks
+        tracked = detections[track_ids >= 0]
+        tracked.track_ids = track_ids[track_ids >= 0]
+        return tracked
     
-    def _match_detection(self, bbox: List[float]) -> int:
-        """Match detection to existing track using IOU"""
-        best_iou = 0
-        best_id = None
+    def propagate(self, frame: np.ndarray) -> Detections:
+        """
+        Extrapolate tracks to a frame on which detection was skipped
+        
+        Tracks confirmed by the last detection update are moved by the
+        motion model and, if enabled, corrected with the median optical
+        flow of a grid of points inside each box.
+        
+        Args:
+            frame: Current frame
+            
+        Returns:
+            Propagated tracks
+        """
+        previous_bboxes = self.track_bboxes
+        self._predict()
+        active = np.flatnonzero(self.track_active)
+        
+        if self.use_optical_flow and self.prev_gray is not None and frame is not None and len(active):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            shifts, valid = self._flow_shifts(self.prev_gray, gray, previous_bboxes[active])
+            if valid.any():
+                flowed = active[valid]
+                measured = previous_bboxes[flowed] + np.tile(shifts[valid], 2)
+                self.track_means[flowed], self.track_covariances[flowed] = self.kalman.update(
+                    self.track_means[flowed], self.track_covariances[flowed], xyxy_to_xyah(measured)
+                )
         
-        for track_id, track_data in self.tracks.items():
-            iou = self._compute_iou(bbox, track_data['bbox'])
-            if iou > best_iou and iou > self.match_thresh:
-                best_iou = iou
-                best_id = track_id
+        self._age_tracks()
+        self._remember_frame(frame)
         
-        return best_id
+        active = self.track_active
+        return Detections(
+            self.track_bboxes[active],
+            self.track_confidences[active],
+            self.track_class_ids[active],
+            self.track_ids[active],
+            self.class_names
+        )
+    
+    def _predict(self):
+        """Advance every live track one step with the motion model"""
+        self.track_ages += 1
+        if len(self.track_ids):
+            self.track_means, self.track_covariances = self.kalman.predict(
+                self.track_means, self.track_covariances
+            )
     
-    def _compute_iou(self, bbox1: List[float], bbox2: List[float]) -> float:
-        """Compute intersection over union"""
-        x1 = max(bbox1[0], bbox2[0])
-        y1 = max(bbox1[1], bbox2[1])
-        x2 = min(bbox1[2], bbox2[2])
-        y2 = min(bbox1[3], bbox2[3])
+    def _flow_shifts(self, prev_gray: np.ndarray, gray: np.ndarray,
+                     bboxes: np.ndarray, grid: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Median Lucas-Kanade displacement of a grid of points inside each box
         
-        if x2 < x1 or y2 < y1:
-            return 0.0
+        Returns:
+            (Nx2 array of (dx, dy) shifts, boolean mask of boxes with enough tracked points)
+        """
+        steps = np.linspace(0.25, 0.75, grid)
+        fx, fy = np.meshgrid(steps, steps)
+        fx, fy = fx.ravel(), fy.ravel()
         
-        intersection = (x2 - x1) * (y2 - y1)
-        area1 = (bbox1[2] - bbox1[0]) * (bbox1[3] - bbox1[1])
-        area2 = (bbox2[2] - bbox2[0]) * (bbox2[3] - bbox2[1])
-        union = area1 + area2 - intersection
+        xs = bboxes[:, [0]] + fx[None, :] * (bboxes[:, [2]] - bboxes[:, [0]])
+        ys = bboxes[:, [1]] + fy[None, :] * (bboxes[:, [3]] - bboxes[:, [1]])
+        points = np.stack([xs, ys], axis=2).reshape(-1, 1, 2).astype(np.float32)
+        
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(
+            prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2
+        )
+        
+        displacement = (moved - points).reshape(len(bboxes), grid * grid, 2)
+        ok = status.reshape(len(bboxes), grid * grid).astype(bool)
+        displacement[~ok] = np.nan
+        
+        valid = ok.sum(axis=1) >= 3
+        shifts = np.zeros((len(bboxes), 2), dtype=np.float32)
+        if valid.any():
+            shifts[valid] = np.nanmedian(displacement[valid], axis=1)
+        return shifts, valid
+    
+    def _remember_frame(self, frame: np.ndarray):
+        if self.use_optical_flow and frame is not None:
+            self.prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    def _assign(self, cost: np.ndarray, thresh: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Solve the assignment problem, rejecting pairs whose cost exceeds thresh
+        
+        Returns:
+            (K x 2 array of matched (row, col) pairs, unmatched rows, unmatched cols)
+        """
+        n_rows, n_cols = cost.shape
+        if cost.size == 0:
+            return np.empty((0, 2), dtype=np.int64), np.arange(n_rows), np.arange(n_cols)
+        
+        rows, cols = linear_sum_assignment(cost)
+        valid = cost[rows, cols] <= thresh
+        rows, cols = rows[valid], cols[valid]
+        
+        return (
+            np.stack([rows, cols], axis=1),
+            np.setdiff1d(np.arange(n_rows), rows),
+            np.setdiff1d(np.arange(n_cols), cols)
+        )
+    
+    def _apply_matches(self, track_idx: np.ndarray, det_idx: np.ndarray,
+                       detections: Detections, track_ids: np.ndarray):
+        """Correct matched tracks with their detections"""
+        if len(track_idx):
+            self.track_means[track_idx], self.track_covariances[track_idx] = self.kalman.update(
+                self.track_means[track_idx],
+                self.track_covariances[track_idx],
+                xyxy_to_xyah(detections.bboxes[det_idx])
+            )
+        self.track_confidences[track_idx] = detections.confidences[det_idx]
+        self.track_class_ids[track_idx] = detections.class_ids[det_idx]
+        self.track_ages[track_idx] = 0
+        self.track_active[:] = False
+        self.track_active[track_idx] = True
+        track_ids[det_idx] = self.track_ids[track_idx]
+    
+    def _start_tracks(self, det_idx: np.ndarray, detections: Detections, track_ids: np.ndarray):
+        """Create new tracks from detections"""
+        new_ids = np.arange(self.next_id, self.next_id + len(det_idx), dtype=np.int64)
+        self.next_id += len(det_idx)
+        track_ids[det_idx] = new_ids
         
-        return intersection / union if union > 0 else 0.0
+        means, covariances = self.kalman.initiate(xyxy_to_xyah(detections.bboxes[det_idx]))
+        self.track_ids = np.concatenate([self.track_ids, new_ids])
+        self.track_means = np.concatenate([self.track_means, means])
+        self.track_covariances = np.concatenate([self.track_covariances, covariances])
+        self.track_confidences = np.concatenate([self.track_confidences, detections.confidences[det_idx]])
+        self.track_class_ids = np.concatenate([self.track_class_ids, detections.class_ids[det_idx]])
+        self.track_ages = np.concatenate([self.track_ages, np.zeros(len(det_idx), dtype=np.int64)])
+        self.track_active = np.concatenate([self.track_active, np.ones(len(det_idx), dtype=bool)])
     
     def _age_tracks(self):
         """Remove old tracks"""
-        to_remove = []
-        for track_id in self.tracks:
-            self.tracks[track_id]['age'] += 1
-            if self.tracks[track_id]['age'] > self.track_buffer:
-                to_remove.append(track_id)
-        
-        for track_id in to_remove:
-            del self.tracks[track_id]
+        keep = self.track_ages <= self.track_buffer
+        self.track_ids = self.track_ids[keep]
+        self.track_means = self.track_means[keep]
+        self.track_covariances = self.track_covariances[keep]
+        self.track_confidences = self.track_confidences[keep]
+        self.track_class_ids = self.track_class_ids[keep]
+        self.track_ages = self.track_ages[keep]
+        self.track_active = self.track_active[keep]
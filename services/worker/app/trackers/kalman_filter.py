@@ -0,0 +1,93 @@
+import numpy as np
+from typing import Tuple
+
+def xyxy_to_xyah(bboxes: np.ndarray) -> np.ndarray:
+    """Convert (x1, y1, x2, y2) boxes to (center x, center y, aspect ratio, height)"""
+    width = bboxes[:, 2] - bboxes[:, 0]
+    height = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([
+        bboxes[:, 0] + width / 2,
+        bboxes[:, 1] + height / 2,
+        width / np.maximum(height, 1e-6),
+        height
+    ], axis=1)
+
+def xyah_to_xyxy(states: np.ndarray) -> np.ndarray:
+    """Convert (center x, center y, aspect ratio, height) boxes to (x1, y1, x2, y2)"""
+    height = states[:, 3]
+    width = states[:, 2] * height
+    return np.stack([
+        states[:, 0] - width / 2,
+        states[:, 1] - height / 2,
+        states[:, 0] + width / 2,
+        states[:, 1] + height / 2
+    ], axis=1).astype(np.float32)
+
+class KalmanFilter:
+    """
+    Constant-velocity Kalman filter over (cx, cy, a, h) boxes, as used by SORT/ByteTrack
+    
+    All methods operate on a batch of tracks at once: means are Nx8 and
+    covariances Nx8x8. Noise is scaled by the box height.
+    """
+    
+    def __init__(self, std_weight_position: float = 1.0 / 20, std_weight_velocity: float = 1.0 / 160):
+        self.std_weight_position = std_weight_position
+        self.std_weight_velocity = std_weight_velocity
+        
+        self.motion = np.eye(8)
+        self.motion[:4, 4:] = np.eye(4)
+        self.observation = np.eye(4, 8)
+    
+    def initiate(self, measurements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Create tracks from Nx4 (cx, cy, a, h) measurements"""
+        means = np.concatenate([measurements, np.zeros_like(measurements)], axis=1)
+        
+        height = measurements[:, 3]
+        pos, vel = self.std_weight_position, self.std_weight_velocity
+        std = np.stack([
+            2 * pos * height, 2 * pos * height, np.full_like(height, 1e-2), 2 * pos * height,
+            10 * vel * height, 10 * vel * height, np.full_like(height, 1e-5), 10 * vel * height
+        ], axis=1)
+        
+        return means, self._diag(std ** 2)
+    
+    def predict(self, means: np.ndarray, covariances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Advance every track by one step"""
+        height = means[:, 3]
+        pos, vel = self.std_weight_position, self.std_weight_velocity
+        std = np.stack([
+            pos * height, pos * height, np.full_like(height, 1e-2), pos * height,
+            vel * height, vel * height, np.full_like(height, 1e-5), vel * height
+        ], axis=1)
+        
+        means = means @ self.motion.T
+        covariances = self.motion @ covariances @ self.motion.T + self._diag(std ** 2)
+        return means, covariances
+    
+    def update(self, means: np.ndarray, covariances: np.ndarray,
+               measurements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Correct tracks with Nx4 (cx, cy, a, h) measurements"""
+        height = means[:, 3]
+        pos = self.std_weight_position
+        std = np.stack([
+            pos * height, pos * height, np.full_like(height, 1e-1), pos * height
+        ], axis=1)
+        
+        projected_mean = means @ self.observation.T
+        projected_cov = self.observation @ covariances @ self.observation.T + self._diag(std ** 2)
+        
+        gain = covariances @ self.observation.T @ np.linalg.inv(projected_cov)
+        innovation = measurements - projected_mean
+        
+        means = means + (gain @ innovation[..., None])[..., 0]
+        covariances = covariances - gain @ projected_cov @ gain.transpose(0, 2, 1)
+        return means, covariances
+    
+    @staticmethod
+    def _diag(values: np.ndarray) -> np.ndarray:
+        """Stack rows of values into a batch of diagonal matrices"""
+        n, d = values.shape
+        matrices = np.zeros((n, d, d))
+        matrices[:, np.arange(d), np.arange(d)] = values
+        return matrices
@@ -0,0 +1,95 @@
+import contextlib
+import hashlib
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio
+    
+    Entries are keyed by a SHA-256 of the text and voice settings and are
+    kept in a size-bounded in-memory LRU backed by one file per entry on disk.
+    Safe to share between threads; disk reads and writes happen outside the
+    lock. Disk errors (a full or read-only cache_dir) are logged and the
+    entry is treated as missing, so they never fail synthesis.
+    """
+    
+    def __init__(self, config: Dict):
+        self.config = config
+        self.max_memory_bytes = int(config.get('memory_cache_mb', 64) * 1024 * 1024)
+        cache_dir = config.get('cache_dir')
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir is not None:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                log.warning("Audio cache directory unavailable, caching in memory only: %s", e)
+                self.cache_dir = None
+        self.entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(text: str, voice: str, speed: float, model: str = '') -> str:
+        """Content hash of everything that determines the audio"""
+        return hashlib.sha256(f"{model}\0{voice}\0{speed}\0{text}".encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self.entries.get(key)
+            if audio is not None:
+                self.entries.move_to_end(key)
+        if audio is None and self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                audio = path.read_bytes()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning("Audio cache read error: %s", e)
+            else:
+                self._remember(key, audio)
+        
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return audio
+    
+    def put(self, key: str, audio: bytes):
+        self._remember(key, audio)
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        # Write then rename so readers never see a partial file
+        tmp_path = path.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path.write_bytes(audio)
+            tmp_path.replace(path)
+        except OSError as e:
+            log.warning("Audio cache write error: %s", e)
+            with contextlib.suppress(OSError):
+                tmp_path.unlink(missing_ok=True)
+    
+    def _remember(self, key: str, audio: bytes):
+        with self._lock:
+            if key in self.entries:
+                self.memory_bytes -= len(self.entries.pop(key))
+            self.entries[key] = audio
+            self.memory_bytes += len(audio)
+            while self.memory_bytes > self.max_memory_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.audio"
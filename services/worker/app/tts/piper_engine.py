@@ -0,0 +1,155 @@
+import io
+import json
+import wave
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+
+# Special symbols of the Piper phoneme_id_map
+PAD = '_'
+BOS = '^'
+EOS = '$'
+
+class PiperEngine:
+    """
+    Local Piper (VITS) voice run with ONNX Runtime
+    
+    The ONNX session and voice config are loaded once and kept for the
+    life of the worker. Sentences are phonemized with espeak-ng and
+    synthesized several at a time in one padded batch.
+    """
+    
+    def __init__(self, model_config: Dict, speed: float = 1.0):
+        """
+        Args:
+            model_config: The models.yaml piper section
+            speed: Speaking rate; 2.0 is twice as fast as the voice's default
+        """
+        import onnxruntime
+        
+        self.model_path = Path(model_config['path'])
+        config_path = Path(model_config.get('config') or f"{self.model_path}.json")
+        with open(config_path, 'r', encoding='utf-8') as f:
+            self.voice_config = json.load(f)
+        
+        self.sample_rate = self.voice_config.get('audio', {}).get('sample_rate', 22050)
+        self.voice = self.voice_config.get('espeak', {}).get('voice', 'en-us')
+        self.phoneme_id_map = self.voice_config['phoneme_id_map']
+        inference = self.voice_config.get('inference', {})
+        self.speed = speed
+        # Piper's length_scale is a duration multiplier, the inverse of speed
+        self.scales = np.array([
+            inference.get('noise_scale', 0.667),
+            inference.get('length_scale', 1.0) / speed,
+            inference.get('noise_w', 0.8)
+        ], dtype=np.float32)
+        self.speaker_id = model_config.get('speaker_id', 0)
+        self.batch_size = model_config.get('batch_size', 4)
+        # Samples quieter than this after a sentence are batch padding
+        self.silence_threshold = model_config.get('silence_threshold', 0.01)
+        
+        options = onnxruntime.SessionOptions()
+        threads = model_config.get('num_threads')
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ['CPUExecutionProvider']
+        if model_config.get('device', 'cpu') == 'cuda':
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = onnxruntime.InferenceSession(
+            str(self.model_path),
+            sess_options=options,
+            providers=[p for p in providers if p in onnxruntime.get_available_providers()]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        print(f"Piper voice loaded: {self.model_path.name} ({self.sample_rate} Hz)")
+    
+    def phonemize(self, text: str) -> List[List[str]]:
+        """
+        Split text into sentences of espeak-ng phonemes
+        
+        Returns:
+            One list of phonemes per sentence
+        """
+        from piper_phonemize import phonemize_espeak
+        return [sentence for sentence in phonemize_espeak(text, self.voice) if sentence]
+    
+    def phoneme_ids(self, phonemes: List[str]) -> List[int]:
+        """Map phonemes to model ids, interleaving padding as Piper does"""
+        id_map = self.phoneme_id_map
+        ids = list(id_map[BOS])
+        for phoneme in phonemes:
+            if phoneme not in id_map:
+                continue
+            ids.extend(id_map[phoneme])
+            ids.extend(id_map[PAD])
+        ids.extend(id_map[EOS])
+        return ids
+    
+    def infer(self, sentences: List[List[int]]) -> List[np.ndarray]:
+        """
+        Synthesize a batch of sentences in one session run
+        
+        Args:
+            sentences: Phoneme ids of each sentence
+            
+        Returns:
+            16-bit PCM samples of each sentence
+        """
+        lengths = np.array([len(ids) for ids in sentences], dtype=np.int64)
+        pad_id = self.phoneme_id_map[PAD][0]
+        batch = np.full((len(sentences), lengths.max()), pad_id, dtype=np.int64)
+        for i, ids in enumerate(sentences):
+            batch[i, :len(ids)] = ids
+        
+        inputs = {'input': batch, 'input_lengths': lengths, 'scales': self.scales}
+        if 'sid' in self.input_names:
+            inputs['sid'] = np.full(len(sentences), self.speaker_id, dtype=np.int64)
+        audio = self.session.run(None, inputs)[0].reshape(len(sentences), -1)
+        
+        # Shorter sentences come back followed by the padding's near-silence
+        return [self._to_pcm(self._trim(samples)) for samples in audio]
+    
+    def stream(self, texts: List[str]) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Synthesize texts sentence by sentence, batch_size sentences per run
+        
+        Args:
+            texts: Lines to synthesize
+            
+        Yields:
+            (index of the text, PCM of one sentence), in order, as soon as
+            the batch holding that sentence has been synthesized
+        """
+        pending = [
+            (index, self.phoneme_ids(phonemes))
+            for index, text in enumerate(texts)
+            for phonemes in self.phonemize(text)
+        ]
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            for (index, _), pcm in zip(chunk, self.infer([ids for _, ids in chunk])):
+                yield index, pcm
+    
+    def to_wav(self, pcm: np.ndarray) -> bytes:
+        """Wrap 16-bit mono PCM in a WAV container"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+    
+    def _trim(self, samples: np.ndarray) -> np.ndarray:
+        loud = np.flatnonzero(np.abs(samples) > self.silence_threshold)
+        if len(loud) == 0:
+            return samples[:0]
+        # Keep a short tail so the last phoneme is not clipped
+        end = min(len(samples), loud[-1] + 1 + self.sample_rate // 20)
+        return samples[:end]
+    
+    @staticmethod
+    def _to_pcm(samples: np.ndarray) -> np.ndarray:
+        # Piper normalises by peak volume before converting
+        peak = max(0.01, float(np.abs(samples).max())) if len(samples) else 1.0
+        return np.clip(samples * (32767.0 / peak), -32767, 32767).astype(np.int16)
@@ -1,71 +1,179 @@
-from typing import Dict
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
 import numpy as np
 import os
-from openai import OpenAI
-import io
 from pathlib import Path
 from dotenv import load_dotenv
+from app.tts.audio_cache import AudioCache
+from app.utils.metrics import metrics
 
 # Load environment variables
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 class PiperTTS:
-    """Text-to-speech using OpenAI TTS"""
+    """Text-to-speech using a local Piper voice or OpenAI TTS"""
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, model_config: Optional[Dict] = None):
         self.config = config
+        self.model_config = model_config or {}
+        self.cache = AudioCache(config)
+        self.engine = None
+        self.client = None
+        self.use_openai = False
         
-        # Initialize OpenAI client
+        # 'piper', 'openai' or 'auto', which prefers a local Piper voice
         api_key = os.getenv('OPENAI_API_KEY')
-        if api_key:
-            self.client = OpenAI(api_key=api_key)
+        self.backend = config.get('backend', 'auto')
+        if self.backend == 'auto':
+            if Path(self.model_config.get('path', '')).is_file():
+                self.backend = 'piper'
+            else:
+                self.backend = 'openai'
+        
+        if self.backend == 'piper':
+            self._load_model()
+        
+        if self.engine is not None:
+            print("Piper TTS enabled for speech synthesis")
+        elif api_key:
+            from openai import OpenAI
+            self.client = OpenAI(api_key=api_key, base_url=config.get('base_url') or os.getenv('OPENAI_BASE_URL'))
             self.use_openai = True
             print("OpenAI TTS enabled for speech synthesis")
         else:
-            self.client = None
-            self.use_openai = False
-            print("TTS disabled (no OpenAI API key found)")
+            print("TTS disabled (no Piper voice or OpenAI API key found)")
+    
+    @property
+    def available(self) -> bool:
+        """Whether a speech backend (Piper or OpenAI) is set up"""
+        return self.engine is not None or (self.use_openai and self.client is not None)
     
     def _load_model(self):
-        """Load TTS model (not needed for OpenAI)"""
-        pass
+        """Load the Piper voice once so every line reuses the same session"""
+        try:
+            from app.tts.piper_engine import PiperEngine
+            self.engine = PiperEngine(self.model_config, speed=self.config.get('speed', 1.0))
+        except Exception as e:
+            print(f"Failed to load Piper voice: {e}")
+            self.engine = None
     
-    def synthesize(self, text: str) -> bytes:
+    def synthesize(self, text: str) -> Optional[bytes]:
         """
         Convert text to speech using OpenAI TTS
         
+        Audio is looked up in the content-addressed cache first, so
+        repeated lines (e.g. templates) are only synthesized once.
+        
         Args:
             text: Commentary text to synthesize
             
         Returns:
-            Audio data as bytes
+            Audio data as bytes (MP3 from OpenAI, WAV from Piper), or None if
+            synthesis failed, so callers can fall back to other speech
         """
-        print(f"[TTS] {text}")
+        log.debug("[TTS] %s", text)
         
-        if self.use_openai and self.client:
+        if self.engine is not None:
+            key = self._piper_key(text)
+            audio = self.cache.get(key)
+            if audio is not None:
+                return audio
+            try:
+                pcm = [chunk for _, chunk in self.engine.stream([text])]
+                audio = self.engine.to_wav(np.concatenate(pcm) if pcm else np.zeros(0, dtype=np.int16))
+                self.cache.put(key, audio)
+                return audio
+            except Exception as e:
+                log.warning("Piper TTS error: %s", e)
+        
+        elif self.use_openai and self.client:
+            model = self.config.get('model', 'tts-1')
+            voice = self.config.get('voice', 'alloy')
+            speed = self.config.get('speed', 1.0)
+            key = self.cache.key(text, voice, speed, model)
+            
+            audio = self.cache.get(key)
+            if audio is not None:
+                return audio
+            
             try:
-                response = self.client.audio.speech.create(
-                    model=self.config.get('model', 'tts-1'),
-                    voice=self.config.get('voice', 'alloy'),
-                    input=text,
-                    speed=self.config.get('speed', 1.0)
-                )
+                metrics.inc('external_api_requests_total', api='tts')
+                with metrics.timer('external_api_seconds', api='tts'):
+                    response = self.client.audio.speech.create(
+                        model=model,
+                        voice=voice,
+                        input=text,
+                        speed=speed
+                    )
                 
                 # Return audio bytes
+                self.cache.put(key, response.content)
                 return response.content
                 
             except Exception as e:
-                print(f"OpenAI TTS error: {e}")
+                metrics.inc('external_api_errors_total', api='tts')
+                log.warning("OpenAI TTS error: %s", e)
         
-        # Fallback: Generate simple tone as placeholder
-        sample_rate = 22050
-        duration = 2.0
-        frequency = 440.0
+        return None
+    
+    def synthesize_stream(self, texts: List[str]) -> Iterator[Tuple[int, bytes]]:
+        """
+        Synthesize several lines, yielding audio as soon as it is ready
         
-        t = np.linspace(0, duration, int(sample_rate * duration))
-        audio = np.sin(2 * np.pi * frequency * t)
+        With Piper, sentences from all uncached lines are batched into as
+        few inference runs as possible and each sentence is yielded as its
+        own WAV chunk; other backends yield one chunk per line. Lines that
+        fail to synthesize yield nothing, and the viewer falls back to
+        browser speech.
         
-        # Convert to 16-bit PCM
-        audio_int16 = (audio * 32767).astype(np.int16)
+        Args:
+            texts: Commentary lines to synthesize
+            
+        Yields:
+            (index of the line, audio chunk), in line order
+        """
+        if self.engine is None:
+            for index, text in enumerate(texts):
+                audio = self.synthesize(text)
+                if audio is not None:
+                    yield index, audio
+            return
         
-        return audio_int16.tobytes()
+        keys = [self._piper_key(text) for text in texts]
+        cached = [self.cache.get(key) for key in keys]
+        misses = [index for index, audio in enumerate(cached) if audio is None]
+        
+        next_index = 0
+        current, parts = None, []
+        try:
+            for i, pcm in self.engine.stream([texts[index] for index in misses]):
+                index = misses[i]
+                if index != current:
+                    self._store_line(keys, current, parts)
+                    current, parts = index, []
+                    # Cached lines before this one go out first
+                    for earlier in range(next_index, index):
+                        if cached[earlier] is not None:
+                            yield earlier, cached[earlier]
+                    next_index = index + 1
+                parts.append(pcm)
+                yield index, self.engine.to_wav(pcm)
+        except Exception as e:
+            log.warning("Piper TTS error: %s", e)
+            current = None
+        self._store_line(keys, current, parts)
+        
+        for index in range(next_index, len(texts)):
+            if cached[index] is not None:
+                yield index, cached[index]
+    
+    def _store_line(self, keys: List[str], index: Optional[int], parts: List[np.ndarray]):
+        """Cache a fully synthesized line as one WAV"""
+        if index is not None and parts:
+            self.cache.put(keys[index], self.engine.to_wav(np.concatenate(parts)))
+    
+    def _piper_key(self, text: str) -> str:
+        voice = f"{self.engine.model_path.name}:{self.engine.speaker_id}"
+        return self.cache.key(text, voice, self.engine.speed, 'piper')
@@ -0,0 +1,78 @@
+import numpy as np
+from typing import Dict, List, Optional
+
+class Detections:
+    """
+    Structure-of-arrays container for the detections or tracks of one frame
+    
+    Boxes are an Nx4 float32 (x1, y1, x2, y2) array; confidences, class IDs
+    and track IDs are parallel 1-D arrays. Untracked rows have track_id -1.
+    Class names are resolved through a shared id->name mapping instead of
+    being stored per object.
+    """
+    
+    __slots__ = ('bboxes', 'confidences', 'class_ids', 'track_ids', 'class_names')
+    
+    def __init__(self, bboxes=None, confidences=None, class_ids=None, track_ids=None,
+                 class_names: Optional[Dict[int, str]] = None):
+        self.bboxes = np.asarray(bboxes if bboxes is not None else [], dtype=np.float32).reshape(-1, 4)
+        n = len(self.bboxes)
+        self.confidences = self._column(confidences, n, np.float32, 0.0)
+        self.class_ids = self._column(class_ids, n, np.int32, 0)
+        self.track_ids = self._column(track_ids, n, np.int64, -1)
+        self.class_names = class_names if class_names is not None else {}
+    
+    @staticmethod
+    def _column(values, n: int, dtype, fill) -> np.ndarray:
+        if values is None:
+            return np.full(n, fill, dtype=dtype)
+        column = np.asarray(values, dtype=dtype).reshape(-1)
+        if len(column) != n:
+            raise ValueError(f"Expected {n} values, got {len(column)}")
+        return column
+    
+    @classmethod
+    def empty(cls, class_names: Optional[Dict[int, str]] = None) -> 'Detections':
+        return cls(class_names=class_names)
+    
+    def __len__(self) -> int:
+        return len(self.bboxes)
+    
+    def __getitem__(self, index) -> 'Detections':
+        """Select rows by boolean mask, index array or slice"""
+        if isinstance(index, (int, np.integer)):
+            index = [index]
+        return Detections(
+            self.bboxes[index],
+            self.confidences[index],
+            self.class_ids[index],
+            self.track_ids[index],
+            self.class_names
+        )
+    
+    def class_mask(self, class_name: str) -> np.ndarray:
+        """Boolean mask of rows belonging to class_name"""
+        ids = [class_id for class_id, name in self.class_names.items() if name == class_name]
+        return np.isin(self.class_ids, ids)
+    
+    def count(self, class_name: str) -> int:
+        """Number of rows belonging to class_name"""
+        return int(self.class_mask(class_name).sum())
+    
+    def to_dicts(self) -> List[Dict]:
+        """Convert to a list of dicts for JSON/Redis payloads"""
+        records = []
+        for bbox, confidence, class_id, track_id in zip(
+            self.bboxes.tolist(), self.confidences.tolist(),
+            self.class_ids.tolist(), self.track_ids.tolist()
+        ):
+            record = {
+                'bbox': bbox,
+                'confidence': confidence,
+                'class_id': class_id,
+                'class_name': self.class_names.get(class_id, str(class_id))
+            }
+            if track_id >= 0:
+                record['track_id'] = track_id
+            records.append(record)
+        return records
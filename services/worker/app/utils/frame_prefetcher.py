@@ -0,0 +1,93 @@
+import asyncio
+import concurrent.futures
+import threading
+import cv2
+import numpy as np
+from typing import Iterable, List, Optional, Tuple
+
+class FramePrefetcher:
+    """Decode frames on a background thread into a bounded buffer"""
+    
+    def __init__(self, frames: Iterable[Tuple[int, float, np.ndarray]], maxsize: int = 8,
+                 resize_width: Optional[int] = None):
+        self.frames = frames
+        self.resize_width = resize_width
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.error: Optional[BaseException] = None
+        self._exhausted = False
+        self._loop = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-prefetch", daemon=True)
+    
+    def start(self):
+        """Start decoding on the background thread"""
+        self._loop = asyncio.get_running_loop()
+        self._thread.start()
+    
+    def stop(self):
+        """Ask the producer to stop and wait for it to exit"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+    
+    def qsize(self) -> int:
+        """Number of decoded frames waiting to be consumed"""
+        return self.queue.qsize()
+    
+    def _resize(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        if not self.resize_width or width <= self.resize_width:
+            return frame
+        scale = self.resize_width / width
+        return cv2.resize(frame, (self.resize_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+    
+    def _put(self, item) -> bool:
+        """Put an item on the loop's queue, blocking while it is full (backpressure)"""
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self._loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._stop.is_set():
+                    future.cancel()
+                    return False
+    
+    def _run(self):
+        try:
+            for frame_id, timestamp, frame in self.frames:
+                if self._stop.is_set():
+                    break
+                if not self._put((frame_id, timestamp, self._resize(frame))):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            # End-of-stream marker
+            if not self._stop.is_set():
+                self._put(None)
+    
+    async def next_batch(self, max_size: int) -> List[Tuple[int, float, np.ndarray]]:
+        """
+        Wait for one frame, then take up to max_size - 1 more that are already decoded
+        
+        Returns:
+            List of (frame_id, timestamp, frame) tuples; empty at end of stream
+        """
+        batch = []
+        if self._exhausted:
+            if self.error is not None:
+                raise self.error
+            return batch
+        
+        item = await self.queue.get()
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= max_size or self.queue.empty():
+                return batch
+            item = self.queue.get_nowait()
+        
+        self._exhausted = True
+        if not batch and self.error is not None:
+            raise self.error
+        return batch
@@ -0,0 +1,60 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let each logging call site through at most once every interval seconds
+    
+    Per-frame messages would otherwise flood the output at high frame
+    rates. Records dropped in between are counted, and the count is
+    appended to the next record that gets through. Errors, and records
+    logged with extra={'rate_limit': False}, always get through.
+    """
+    
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._lock = threading.Lock()
+        # (path, line) -> (time last let through, records suppressed since)
+        self._sites: Dict[tuple, list] = {}
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0 or record.levelno >= logging.ERROR or not getattr(record, 'rate_limit', True):
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is not None and now - state[0] < self.interval:
+                state[1] += 1
+                return False
+            suppressed = state[1] if state is not None else 0
+            self._sites[site] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+def setup_logging(config: Optional[Dict] = None):
+    """
+    Configure the app.* loggers once per process
+    
+    LOG_LEVEL and LOG_RATE_LIMIT in the environment override the
+    level and rate_limit_seconds settings.
+    """
+    config = config or {}
+    logger = logging.getLogger('app')
+    level = os.getenv('LOG_LEVEL') or config.get('level', 'INFO')
+    logger.setLevel(level.upper())
+    if logger.handlers:
+        return
+    
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    interval = float(os.getenv('LOG_RATE_LIMIT') or config.get('rate_limit_seconds', 1.0))
+    handler.addFilter(RateLimitFilter(interval))
+    logger.addHandler(handler)
+    # Keep records out of the root logger's handlers
+    logger.propagate = False
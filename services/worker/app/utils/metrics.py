@@ -0,0 +1,141 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Redis hashes the workers add their deltas to; the API renders them
+COUNTERS_KEY = 'metrics:counters'
+HISTOGRAMS_KEY = 'metrics:histograms'
+
+log = logging.getLogger(__name__)
+
+def series(name: str, **labels) -> str:
+    """Prometheus series name, e.g. stage_seconds{stage="detect"}"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+class Metrics:
+    """
+    Process-local counters and latency histograms
+    
+    Recording only touches in-memory dicts under a lock, so it is cheap
+    enough for the per-frame path and safe from worker threads.
+    flush() periodically adds the accumulated deltas to Redis hashes,
+    where the deltas of every worker process on every node sum up.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = defaultdict(float)
+        # series -> [count per bucket (+Inf last), sum, count]
+        self.histograms: Dict[str, list] = {}
+    
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = series(name, **labels)
+        with self._lock:
+            self.counters[key] += amount
+    
+    def observe(self, name: str, value: float, **labels):
+        key = series(name, **labels)
+        index = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+    
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the duration of the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    def stage(self, stage: str):
+        """Timer for one pipeline stage"""
+        return self.timer('stage_seconds', stage=stage)
+    
+    async def timed(self, awaitable, name: str, **labels):
+        """Await and observe how long it took"""
+        with self.timer(name, **labels):
+            return await awaitable
+    
+    def timed_iter(self, items: Iterable, name: str, **labels) -> Iterator:
+        """Yield from items, observing the time taken to produce each one"""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(name, time.perf_counter() - start, **labels)
+            yield item
+    
+    def drain(self) -> Dict:
+        """Take the deltas recorded since the last drain"""
+        with self._lock:
+            snapshot = {'counters': dict(self.counters), 'histograms': self.histograms}
+            self.counters = defaultdict(float)
+            self.histograms = {}
+        return snapshot
+    
+    def merge(self, snapshot: Dict):
+        """Add deltas drained in another process, e.g. a segment worker"""
+        with self._lock:
+            for key, value in snapshot['counters'].items():
+                self.counters[key] += value
+            for key, (buckets, total, count) in snapshot['histograms'].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+                histogram[2] += count
+    
+    async def flush(self, redis_client):
+        snapshot = self.drain()
+        if not snapshot['counters'] and not snapshot['histograms']:
+            return
+        
+        # MULTI/EXEC: either every delta is added or none is, so a failed
+        # flush can be retried without counting anything twice
+        pipe = redis_client.pipeline(transaction=True)
+        for key, value in snapshot['counters'].items():
+            pipe.hincrbyfloat(COUNTERS_KEY, key, value)
+        for key, (buckets, total, count) in snapshot['histograms'].items():
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), buckets):
+                if bucket_count:
+                    pipe.hincrby(HISTOGRAMS_KEY, f"{key}|{bound}", bucket_count)
+            pipe.hincrbyfloat(HISTOGRAMS_KEY, f"{key}|sum", total)
+            pipe.hincrby(HISTOGRAMS_KEY, f"{key}|count", count)
+        try:
+            await pipe.execute()
+        except Exception:
+            # Keep the deltas for the next flush
+            self.merge(snapshot)
+            raise
+    
+    async def run_flusher(self, redis_client, interval: float = 5.0):
+        """Flush every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(redis_client)
+            except Exception as e:
+                log.warning("Metrics flush error: %s", e)
+
+# Shared by every component of the process
+metrics = Metrics()
@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from typing import Iterator
+from typing import Iterator, Optional, Tuple
 
 class VideoReader:
     """Video frame reader utility"""
@@ -37,3 +37,55 @@ class VideoReader:
         self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
         ret, frame = self.cap.read()
         return frame if ret else None
+    
+    def resolve_stride(self, stride: Optional[int] = None, target_fps: Optional[float] = None) -> int:
+        """Resolve the sampling stride from an explicit stride or a target fps"""
+        if target_fps and self.fps > 0:
+            return max(1, int(round(self.fps / target_fps)))
+        return max(1, int(stride or 1))
+    
+    def sample(self, stride: Optional[int] = None, target_fps: Optional[float] = None,
+               seek_threshold: int = 0, start: int = 0,
+               end: Optional[int] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        Iterate over sampled frames, decoding only the frames that are kept
+        
+        Skipped frames are only grabbed (demuxed) and never retrieved, so
+        they are not converted to BGR. When the stride reaches
+        seek_threshold the reader seeks straight to the next sampled frame
+        instead, which lets the backend jump between keyframes.
+        
+        Args:
+            stride: Keep every stride-th frame
+            target_fps: Desired sampling rate; overrides stride when set
+            seek_threshold: Minimum stride at which to seek instead of grab (0 disables seeking)
+            start: First frame to read; the reader seeks straight to it
+            end: Stop before this frame (None reads to the end)
+            
+        Returns:
+            Iterator of (frame_id, timestamp, frame) tuples
+        """
+        stride = self.resolve_stride(stride, target_fps)
+        fps = self.fps if self.fps > 0 else 30.0
+        use_seek = seek_threshold > 0 and stride >= seek_threshold
+        
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame_id = start
+        
+        while end is None or frame_id < end:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            
+            yield frame_id, frame_id / fps, frame
+            
+            next_id = frame_id + stride
+            if use_seek:
+                if self.frame_count and next_id >= self.frame_count:
+                    break
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, next_id)
+            else:
+                for _ in range(stride - 1):
+                    if not self.cap.grab():
+                        return
+            frame_id = next_id
@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+WORKER_DIR = Path(__file__).resolve().parents[1]
+BENCHMARKS_DIR = WORKER_DIR.parents[1] / 'benchmarks'
+sys.path.insert(0, str(WORKER_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from mock_openai import MockOpenAIServer
+
+
+@pytest.fixture
+def openai_server():
+    """Local OpenAI-compatible stub from the benchmarks"""
+    server = MockOpenAIServer(latency={'vision': 0.2})
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,19 @@
+from app.tts.audio_cache import AudioCache
+
+
+def test_unwritable_cache_dir_falls_back_to_memory(tmp_path):
+    cache_dir = tmp_path / 'tts'
+    cache = AudioCache({'cache_dir': str(cache_dir)})
+    key = cache.key('Goal!', 'alloy', 1.0, 'tts-1')
+    
+    # A file where the entry directories go makes every disk write and read fail
+    cache_dir.rmdir()
+    cache_dir.write_bytes(b'')
+    cache.put(key, b'audio')
+    assert cache.get(key) == b'audio'
+    cache.entries.clear()
+    assert cache.get(key) is None
+    
+    cache = AudioCache({'cache_dir': str(cache_dir)})
+    assert cache.cache_dir is None
+    assert cache.get(key) is None
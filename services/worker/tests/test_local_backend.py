@@ -0,0 +1,57 @@
+import asyncio
+
+import numpy as np
+import torch
+
+from app.classifiers.video_classifier import VideoClassifier
+from app.pipeline import CommentaryPipeline
+from app.utils.detections import Detections
+
+EVENTS = ['pass', 'shot', 'goal', 'tackle', 'corner', 'free_kick', 'dribble', 'save']
+
+
+class TinyClipModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.fc = torch.nn.Linear(3, len(EVENTS))
+    
+    def forward(self, clips: torch.Tensor) -> torch.Tensor:
+        return self.fc(clips.mean(dim=(2, 3, 4)))
+
+
+def test_pipeline_runs_local_windows_in_batches(tmp_path):
+    model_path = tmp_path / 'clip.pt'
+    torch.jit.script(TinyClipModel()).save(str(model_path))
+    classifier = VideoClassifier(
+        {'backend': 'local', 'events': EVENTS, 'window_size': 4, 'stride': 2, 'max_in_flight': 1,
+         'thumbnail_size': [32, 18]},
+        {'path': str(model_path), 'batch_size': 3, 'num_frames': 4, 'input_size': 16, 'max_batch_wait': 0.5}
+    )
+    batch_sizes = []
+    predict = classifier.local_model.predict
+    classifier.local_model.predict = lambda clips: batch_sizes.append(len(clips)) or predict(clips)
+    
+    pipeline = CommentaryPipeline.__new__(CommentaryPipeline)
+    pipeline.classifier = classifier
+    
+    async def run():
+        tracked = asyncio.Queue()
+        classified = asyncio.Queue(maxsize=classifier.queue_size)
+        for frame_id in range(10):
+            frame = np.full((72, 128, 3), frame_id * 20, dtype=np.uint8)
+            await tracked.put((frame_id, frame_id / 25, frame, Detections.empty()))
+        await tracked.put(None)
+        
+        stage = asyncio.create_task(pipeline._classification_stage(tracked, classified))
+        events = []
+        # Consumed in frame order, like the event stage
+        while (item := await asyncio.wait_for(classified.get(), timeout=5)) is not None:
+            events.extend(await item[3])
+        await stage
+        return events
+    
+    events = asyncio.run(run())
+    
+    # Windows are due at frames 4, 6, 8 and 10; the first three make up a full batch
+    assert batch_sizes == [3, 1]
+    assert len(events) == 4
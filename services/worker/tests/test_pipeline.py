@@ -0,0 +1,52 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.aggregator.event_aggregator import EventAggregator
+from app.pipeline import CommentaryPipeline
+from app.utils.detections import Detections
+
+
+def test_failed_job_cancels_queued_classifications():
+    async def run():
+        classified = asyncio.Queue()
+        classification = asyncio.create_task(asyncio.sleep(60))
+        await classified.put((0, 0.0, None, classification))
+        
+        async def failing_stage():
+            raise RuntimeError("stage failed")
+        
+        with pytest.raises(RuntimeError):
+            await CommentaryPipeline._gather_stages([asyncio.create_task(failing_stage())], classified)
+        await asyncio.sleep(0)
+        return classification
+    
+    assert asyncio.run(run()).cancelled()
+
+
+def test_gated_frames_release_pending_events():
+    async def run():
+        pipeline = CommentaryPipeline.__new__(CommentaryPipeline)
+        pipeline.aggregator = EventAggregator({'fusion_window': 2.0, 'min_confidence': 0.5})
+        classified, aggregated = asyncio.Queue(), asyncio.Queue()
+        goal = asyncio.get_running_loop().create_future()
+        goal.set_result([{'event_type': 'goal', 'confidence': 0.9}])
+        await classified.put((0, 0.0, Detections.empty(), goal))
+        # A replay follows: gated frames only, no live frame and no end of video yet
+        for frame_id in range(1, 4):
+            await classified.put((frame_id, frame_id * 1.0, None, None))
+        
+        stage = asyncio.create_task(pipeline._event_stage(
+            classified, aggregated, {'classifying': classified}, 'job', fakeredis.FakeAsyncRedis(decode_responses=True)
+        ))
+        event, _ = await asyncio.wait_for(aggregated.get(), timeout=1)
+        
+        await classified.put(None)
+        frame_count = await stage
+        return event, frame_count
+    
+    event, frame_count = asyncio.run(run())
+    
+    assert event['event_type'] == 'goal'
+    assert frame_count == 1
@@ -0,0 +1,163 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import fakeredis
+
+from app.scheduler import JobScheduler
+
+CONFIG = {'max_jobs': 2, 'block_seconds': 0.01, 'heartbeat_interval': 0, 'stall_timeout': 0.05}
+
+
+class FakePipeline:
+    """Records processed videos; jobs wait for release when blocking is set"""
+    
+    def __init__(self, blocking: bool = False):
+        self.config = SimpleNamespace(parallel={})
+        self.processed = []
+        self.release = asyncio.Event()
+        self.blocking = blocking
+    
+    def for_job(self):
+        return self
+    
+    async def process_video(self, video_path, job_id, redis_client, parallel=False):
+        self.processed.append(job_id)
+        if self.blocking:
+            await self.release.wait()
+        await redis_client.set(f"job:{job_id}:status", "completed")
+
+
+async def submit(redis_client, job_id: str) -> str:
+    job = {'job_id': job_id, 'video_path': f'/videos/{job_id}.mp4', 'filename': f'{job_id}.mp4',
+           'content_key': f'key-{job_id}'}
+    return await redis_client.xadd('video_jobs', {'job': json.dumps(job)})
+
+
+async def deliver_to_dead_worker(redis_client, times: int = 1):
+    """Deliver the next entry to a consumer that never finishes it"""
+    await redis_client.xreadgroup('workers', 'dead', {'video_jobs': '>'}, count=1)
+    for _ in range(times - 1):
+        await asyncio.sleep(0.01)
+        pending = await redis_client.xpending_range('video_jobs', 'workers', min='-', max='+', count=1)
+        await redis_client.xclaim('video_jobs', 'workers', 'dead', 0, [pending[0]['message_id']])
+    await asyncio.sleep(0.1)
+
+
+def make_scheduler(redis_client, pipeline, consumer: str, **config) -> JobScheduler:
+    return JobScheduler(pipeline, redis_client, {**CONFIG, **config}, consumer=consumer)
+
+
+def test_default_consumer_names_are_unique():
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    pipeline = FakePipeline()
+    
+    assert JobScheduler(pipeline, redis_client, CONFIG).consumer != JobScheduler(pipeline, redis_client, CONFIG).consumer
+
+
+def test_new_job_is_claimed_processed_and_acknowledged():
+    async def run():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        pipeline = FakePipeline()
+        scheduler = make_scheduler(redis_client, pipeline, 'a')
+        await scheduler.setup()
+        await submit(redis_client, 'job1')
+        
+        await scheduler.poll()
+        await asyncio.gather(*scheduler.jobs.values())
+        
+        assert pipeline.processed == ['job1']
+        assert await redis_client.get('job:job1:worker') == 'a'
+        assert await redis_client.get('result:key-job1') == 'job1'
+        assert await redis_client.xlen('video_jobs') == 0
+        assert (await redis_client.xpending('video_jobs', 'workers'))['pending'] == 0
+    
+    asyncio.run(run())
+
+
+def test_stalled_job_is_reclaimed():
+    async def run():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        pipeline = FakePipeline()
+        scheduler = make_scheduler(redis_client, pipeline, 'a')
+        await scheduler.setup()
+        await submit(redis_client, 'job1')
+        await deliver_to_dead_worker(redis_client)
+        
+        await scheduler.poll()
+        await asyncio.gather(*scheduler.jobs.values())
+        
+        assert pipeline.processed == ['job1']
+        assert await redis_client.xlen('video_jobs') == 0
+    
+    asyncio.run(run())
+
+
+def test_job_that_keeps_failing_is_dead_lettered():
+    async def run():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        pipeline = FakePipeline()
+        scheduler = make_scheduler(redis_client, pipeline, 'a', max_deliveries=2)
+        await scheduler.setup()
+        await submit(redis_client, 'job1')
+        await deliver_to_dead_worker(redis_client, times=2)
+        
+        # This would be the third delivery
+        await scheduler.poll()
+        
+        assert pipeline.processed == []
+        assert not scheduler.jobs
+        assert await redis_client.get('job:job1:status') == 'error: abandoned after 2 worker failures'
+        assert await redis_client.xlen('video_jobs') == 0
+    
+    asyncio.run(run())
+
+
+def test_heartbeat_stops_job_taken_over_by_another_worker():
+    async def run():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        slow = make_scheduler(redis_client, FakePipeline(blocking=True), 'slow')
+        other_pipeline = FakePipeline()
+        other = make_scheduler(redis_client, other_pipeline, 'other')
+        await slow.setup()
+        await submit(redis_client, 'job1')
+        
+        await slow.poll()
+        task = next(iter(slow.jobs.values()))
+        await asyncio.sleep(0.1)
+        
+        # slow missed its heartbeats, so other takes the job over
+        await other.poll()
+        await asyncio.gather(*other.jobs.values())
+        await slow.heartbeat()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        assert task.cancelled()
+        assert other_pipeline.processed == ['job1']
+        assert not slow.jobs
+    
+    asyncio.run(run())
+
+
+def test_heartbeat_keeps_running_job():
+    async def run():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        pipeline = FakePipeline(blocking=True)
+        scheduler = make_scheduler(redis_client, pipeline, 'a')
+        other = make_scheduler(redis_client, FakePipeline(), 'other')
+        await scheduler.setup()
+        await submit(redis_client, 'job1')
+        
+        await scheduler.poll()
+        await asyncio.sleep(0.1)
+        await scheduler.heartbeat()
+        
+        # The heartbeat reset the idle time, so nothing is stalled
+        await other.poll()
+        assert not other.jobs
+        
+        pipeline.release.set()
+        await asyncio.gather(*scheduler.jobs.values())
+        assert await redis_client.xlen('video_jobs') == 0
+    
+    asyncio.run(run())
@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.classifiers.video_classifier import VideoClassifier
+from app.utils.detections import Detections
+
+CLASS_NAMES = {0: 'person', 32: 'sports ball'}
+
+
+def make_classifier(monkeypatch, base_url: str, max_in_flight: int = 2, **config) -> VideoClassifier:
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    return VideoClassifier({
+        'backend': 'vlm',
+        'clip_mode': 'frame',
+        'window_size': 4,
+        'max_in_flight': max_in_flight,
+        'base_url': base_url,
+        **config
+    })
+
+
+def make_frames(n: int):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=(36, 64, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def make_tracks() -> Detections:
+    """Eleven players and a ball, enough for the heuristic to call a pass"""
+    boxes = [(i * 10, 0, i * 10 + 5, 10) for i in range(12)]
+    return Detections(boxes, np.full(12, 0.9), [0] * 11 + [32], class_names=CLASS_NAMES)
+
+
+async def classify_all(classifier: VideoClassifier, frames, tracks):
+    # Started in frame order, awaited together
+    pending = [classifier.classify_async(frame, tracks) for frame in frames]
+    return await asyncio.gather(*pending)
+
+
+def test_classify_async_keeps_frame_order(monkeypatch, openai_server):
+    frames = make_frames(6)
+    tracks = Detections.empty(CLASS_NAMES)
+    
+    concurrent = asyncio.run(classify_all(make_classifier(monkeypatch, openai_server.base_url), frames, tracks))
+    
+    async def one_at_a_time(classifier):
+        return [await classifier.classify_async(frame, tracks) for frame in frames]
+    
+    sequential = asyncio.run(one_at_a_time(make_classifier(monkeypatch, openai_server.base_url)))
+    
+    assert concurrent == sequential
+    assert [events[0]['timestamp'] for events in concurrent] == [1, 2, 3, 4, 4, 4]
+
+
+def test_classify_async_limits_requests_in_flight(monkeypatch, openai_server):
+    classifier = make_classifier(monkeypatch, openai_server.base_url, max_in_flight=2)
+    
+    results = asyncio.run(classify_all(classifier, make_frames(8), Detections.empty(CLASS_NAMES)))
+    
+    assert len(results) == 8
+    assert openai_server.requests['vision'] == 8
+    assert openai_server.peak_in_flight == 2
+
+
+def test_classify_async_falls_back_to_heuristics(monkeypatch):
+    # Nothing listens on the discard port
+    classifier = make_classifier(monkeypatch, 'http://127.0.0.1:9/v1')
+    classifier.async_client = AsyncOpenAI(api_key='test', base_url='http://127.0.0.1:9/v1', max_retries=0)
+    frames = make_frames(5)
+    
+    results = asyncio.run(classify_all(classifier, frames, make_tracks()))
+    
+    # The heuristic only reports a pass once the window is full
+    assert results[:3] == [[], [], []]
+    assert [events[0]['event_type'] for events in results[3:]] == ['pass', 'pass']
+
+
+def test_similar_frames_share_a_request_in_flight(monkeypatch, openai_server):
+    classifier = make_classifier(monkeypatch, openai_server.base_url, cache={'enabled': True, 'max_distance': 4})
+    frame = make_frames(1)[0]
+    
+    results = asyncio.run(classify_all(classifier, [frame] * 4, Detections.empty(CLASS_NAMES)))
+    
+    assert openai_server.requests['vision'] == 1
+    assert [events[0]['timestamp'] for events in results] == [1, 2, 3, 4]
+    assert len({events[0]['event_type'] for events in results}) == 1